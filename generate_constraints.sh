@@ -195,7 +195,7 @@ fi
 for file in "${int_file_folder}"*
 do
 	case "${file}" in
-		"${int_file_folder}constraintsCorrectNR_and_splitUnionNEW.txt"|"${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" ) ((count+=1)) ;;
+		"${int_file_folder}constraintsCorrectNR_and_splitUnionNEW.txt"|"${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" ) ((count+=1)) ;;
 		* )	;;
 	esac
 done
@@ -223,13 +223,13 @@ case "${type}" in
                          -owl "${go_folder}${used_go}" -partition "${tax_constr_def_file}" ;;
     # For each species in $species_list_file get the automatic taxonomic constraints.
     "automatic"|"a"|"auto" ) echo 'Generate automatic GO taxon constraints' ;
-                             "${src_folder}"./createConstraintsMergedAndSpecific.py -aut_const "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" \
+                             "${src_folder}"./createConstraintsMergedAndSpecific.py -aut_db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" \
                              -list "${species_list_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -outdir "${output_folder}" \
                              -log "${int_file_folder}logfile.txt" -manual "${manual_constr_file}" -owl "${go_folder}${used_go}" -partition "${tax_constr_def_file}" ;;
     # For each species in $species_list_file get the manual and automatic taxonomic constraints.
     * ) echo 'Merge the automatic constraints with the manual GO taxon constraints' ;
         "${src_folder}"./createConstraintsMergedAndSpecific.py -go_const "${int_file_folder}constraintsCorrectNR_and_splitUnionNEW.txt" \
-        -aut_const "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" -list "${species_list_file}" -merge "${taxonomy_folder}merged.dmp" \
+        -aut_db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" -list "${species_list_file}" -merge "${taxonomy_folder}merged.dmp" \
         -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -outdir "${output_folder}" -log "${int_file_folder}logfile.txt" -manual "${manual_constr_file}" \
         -owl "${go_folder}${used_go}" -partition "${tax_constr_def_file}" ;;
 esac
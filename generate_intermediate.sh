@@ -100,10 +100,14 @@ species_list_file="${config_array[species]}" # It's the list of species file pat
 manual_constr_file="${config_array[manual-constraints]}" # It's the manual constraints definition file. It's given by the parameter 'manual-constratins' in the configuration file. If not provided, an empty string is saved.
 int_file_folder="${base_folder}intermediate_files/" # It's the folder where the intermediate files are saved.
 cut_off="${config_array[cutoff]}" # It's the GO's frequency threshold used to define constraints. It's given by the parameter 'cutoff' in the configuration file. If not provided an empty string is saved.
+cut_off_sweep="${config_array[cutoff-sweep]}" # It's the comma separated list of GO's frequency thresholds evaluated together in the cutoff_only mode. It's given by the parameter 'cutoff-sweep' in the configuration file. If not provided an empty string is saved.
 type="${config_array[type]}" # It's the type of taxonomic constraints we want to be generated. It's given by the parameter 'type' in the configuration file. If not provided an empty string is saved and all the type (manual, automatic) are used.
 used_go='' # It's the gene ontology file name.
 used_goa='goa_uniprot_all.gaf' # It's the gene ontology annotation file name.
 unclassified_file="${config_array[unclassified]}" # list of unclassified and other nodes above order rank to remove their annotation contribution
+resume="${config_array[resume]}" # If true, the GAF reading steps continue from their last checkpoint. It's given by the parameter 'resume' in the configuration file. If not provided an empty string is saved.
+resume_opt='' # It's the option passed to the GAF reading steps to continue from their last checkpoint.
+workers="${config_array[workers]}" # It's the number of processes computing the cumulated frequencies of the subdivisions. It's given by the parameter 'workers' in the configuration file. If not provided an empty string is saved.
 
 
 # Sets the taxonomy folder if not defined in the configuration file.
@@ -166,6 +170,20 @@ then
     cut_off=500
 fi
 
+# Sets the number of workers to 1 if it is not defined in the configuration file.
+if [[ ${#workers} -eq 0 ]]
+then
+    workers=1
+fi
+
+
+# Sets the resume option if required in the configuration file.
+case "${resume}" in
+    "true"|"t" ) resume_opt='-resume' ;;
+    "false"|"f"|"" ) ;;
+    * ) echo "Err: Unknown boolean value \"${resume}\"" 1>&2; exit 1 ;;
+esac
+
 
 # Check if the gene ontology and the taxonomy files are present.
 verifyGoFilePresence "${go_folder}" "${real_path}" "${config_file}"
@@ -188,23 +206,25 @@ case "${type}" in
     # Generate only automatic taxonomic constraints using the data from the filtered gene ontology annotation file.
     "automatic"|"a"|"auto" )
                          echo 'Discard ND, roots and RNACentral hits from GOA' ;
-                         "${src_folder}"./purgeRootsInterproFormGaf.py -gaf "${goa_folder}${used_goa}" -unclass "${unclassified_file}" -gafout "${int_file_folder}goa_uniprot_all.gaf" ;
+                         "${src_folder}"./purgeRootsInterproFormGaf.py -gaf "${goa_folder}${used_goa}" -unclass "${unclassified_file}" -gafout "${int_file_folder}goa_uniprot_all.gaf" \
+                         -checkpoint "${int_file_folder}goa_uniprot_all.gaf.checkpoint" ${resume_opt} ;
 
                          echo 'Calculate GO frequencies from purged GOA file' ;
                          "${src_folder}"./GOAfreq.py -owl "${go_folder}${used_go}" -gaf_wo "${int_file_folder}goa_uniprot_all.gaf" \
-                         -out_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" ;
+                         -out_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -checkpoint "${int_file_folder}goa_uniprot_all_CumulFreq.txt.checkpoint" ${resume_opt} ;
 
                          echo 'Produce for each species the list of GO occurrences found' ;
                          "${src_folder}"./speciesToGO.py -gaf "${int_file_folder}goa_uniprot_all.gaf" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" \
-                         -names "${taxonomy_folder}names.dmp" -out "${int_file_folder}speciesGOusage.txt" > "${int_file_folder}speciesGOusage_MISSING_taxon.txt" ;
+                         -names "${taxonomy_folder}names.dmp" -out "${int_file_folder}speciesGOusage.txt" -matrix "${int_file_folder}speciesGOusage.bin" -checkpoint "${int_file_folder}speciesGOusage.txt.checkpoint" ${resume_opt} \
+                         -missing "${int_file_folder}speciesGOusage_MISSING_taxon.txt" -delnodes "${taxonomy_folder}delnodes.dmp" ;
 
                          echo 'Cluster species together and their corresponding GO' ;
-                         "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -species "${int_file_folder}speciesGOusage.txt" \
+                         "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -matrix "${int_file_folder}speciesGOusage.bin" \
                          -out "${int_file_folder}cluster_speciesGOusage.txt" ;
 
                          echo 'Compute the cumulative occurrence of GO terms in defined subdivisions using the graph of GO Memory Less' ;
                          "${src_folder}"./speciesFreqCumul.py -owl "${go_folder}${used_go}" -freq "${int_file_folder}cluster_speciesGOusage.txt" \
-                         -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" ;
+                         -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -sparse -workers "${workers}" ;
 
                          echo 'Create never_in considering what we have produced from the cumulated corpus of each subdivision' ;
                          "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" \
@@ -212,25 +232,26 @@ case "${type}" in
 
                          echo 'Wrapper to make output identical' ;
                          "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" \
-                         -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" ;;
+                         -db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" ;;
 
     # Generate all files except purged GOA and GOAfreq.
     "fast"|"f"|"fst" )
                          echo 'Calculate GO frequencies from purged GOA file' ;
                          "${src_folder}"./GOAfreq.py -owl "${go_folder}${used_go}" -gaf_wo "${int_file_folder}goa_uniprot_all.gaf" \
-                         -out_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" ;
+                         -out_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -checkpoint "${int_file_folder}goa_uniprot_all_CumulFreq.txt.checkpoint" ${resume_opt} ;
                          
                          echo 'Produce for each species the list of GO occurrences found' ;
                          "${src_folder}"./speciesToGO.py -gaf "${int_file_folder}goa_uniprot_all.gaf" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" \
-                         -names "${taxonomy_folder}names.dmp" -out "${int_file_folder}speciesGOusage.txt" > "${int_file_folder}speciesGOusage_MISSING_taxon.txt" ;
+                         -names "${taxonomy_folder}names.dmp" -out "${int_file_folder}speciesGOusage.txt" -matrix "${int_file_folder}speciesGOusage.bin" -checkpoint "${int_file_folder}speciesGOusage.txt.checkpoint" ${resume_opt} \
+                         -missing "${int_file_folder}speciesGOusage_MISSING_taxon.txt" -delnodes "${taxonomy_folder}delnodes.dmp" ;
 
                          echo 'Cluster species together and their corresponding GO' ;
-                         "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -species "${int_file_folder}speciesGOusage.txt" \
+                         "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -matrix "${int_file_folder}speciesGOusage.bin" \
                          -out "${int_file_folder}cluster_speciesGOusage.txt" ;
 
                          echo 'Compute the cumulative occurrence of GO terms in defined subdivisions using the graph of GO Memory Less' ;
                          "${src_folder}"./speciesFreqCumul.py -owl "${go_folder}${used_go}" -freq "${int_file_folder}cluster_speciesGOusage.txt" \
-                         -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" ;
+                         -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -sparse -workers "${workers}" ;
 
                          echo 'Create never_in considering what we have produced from the cumulated corpus of each subdivision' ;
                          "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" \
@@ -238,7 +259,7 @@ case "${type}" in
 
                          echo 'Wrapper to make output identical' ;
                          "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" \
-                         -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" ;;
+                         -db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" ;;
 
     # Generate only manual constraints using the data from the gene ontology consortium.
     "GOConsortium"|"goc"|"g" )
@@ -248,52 +269,62 @@ case "${type}" in
 
     # Generate only constraints dependant on cutoff value.
     "cutoff_only"|"c"|"cut" )
-                         echo 'Create never_in considering what we have produced from the cumulated corpus of each subdivision' ;
-                         "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" \
-                         -cumul "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -owl "${go_folder}${used_go}" -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" ;
-
-                          echo 'Wrapper to make output identical' ;
-                         "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" \
-                         -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" ;;
+                         if [[ ${#cut_off_sweep} -eq 0 ]]
+                         then
+                             echo 'Create never_in considering what we have produced from the cumulated corpus of each subdivision' ;
+                             "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" \
+                             -cumul "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -owl "${go_folder}${used_go}" -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" ;
+
+                             echo 'Wrapper to make output identical' ;
+                             "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" \
+                             -db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" ;
+                         else
+                             IFS="," read -r -a cut_offs <<< "${cut_off_sweep// /}" # The list of cut-off values.
+                             echo "Create never_in for the cut-off values ${cut_off_sweep} considering what we have produced from the cumulated corpus of each subdivision" ;
+                             "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_offs[@]}" \
+                             -cumul "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -owl "${go_folder}${used_go}" -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" ;
+
+                             echo 'Wrapper to make output identical' ;
+                             for c in "${cut_offs[@]}"
+                             do
+                                 if [[ ${#cut_offs[@]} -eq 1 ]]
+                                 then
+                                     suffix=''
+                                 else
+                                     suffix="_cutoff${c}"
+                                 fi
+                                 "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN${suffix}.txt" \
+                                 -db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN${suffix}.db" ;
+                             done
+                         fi ;;
 
     #Generate new files based on different taxonomic reference nodes.
     "taxonDef"|"t"|"tax" )
-                         echo 'Cluster species together and their corresponding GO' ;
-                         "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -species "${int_file_folder}speciesGOusage.txt" \
-                         -out "${int_file_folder}cluster_speciesGOusage.txt" ;
-
-                         echo 'Compute the cumulative occurrence of GO terms in defined subdivisions using the graph of GO Memory Less' ;
-                         "${src_folder}"./speciesFreqCumul.py -owl "${go_folder}${used_go}" -freq "${int_file_folder}cluster_speciesGOusage.txt" \
-                         -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" ;
-
-                         echo 'Create never_in considering what we have produced from the cumulated corpus of each subdivision' ;
-                         "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" \
-                         -cumul "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -owl "${go_folder}${used_go}" -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" ;
-
-                         echo 'Wrapper to make output identical' ;
-                         "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" \
-                         -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" ;;
+                         echo 'Cluster species, cumulate GO occurrences and create never_in for the defined subdivisions' ;
+                         "${src_folder}"./repartition.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -species "${int_file_folder}speciesGOusage.txt" \
+                         -owl "${go_folder}${used_go}" -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" -out_dir "${int_file_folder}" -sparse ;;
 
     # Generate the taxonomic constraints using data from the gene ontology consortium and the gene ontology annotation. The first ones are more important than the second ones. 
     * )
         echo 'Discard ND, roots and RNACentral hits from GOA' ;
-        # "${src_folder}"./purgeRootsInterproFormGaf.py -gaf "${goa_folder}${used_goa}" -unclass "${unclassified_file}" -gafout "${int_file_folder}goa_uniprot_all.gaf" ; 
+        # "${src_folder}"./purgeRootsInterproFormGaf.py -gaf "${goa_folder}${used_goa}" -unclass "${unclassified_file}" -gafout "${int_file_folder}goa_uniprot_all.gaf" -checkpoint "${int_file_folder}goa_uniprot_all.gaf.checkpoint" ${resume_opt} ; 
 
         echo 'Calculate GO frequencies from purged GOA file' ;
         "${src_folder}"./GOAfreq.py -owl "${go_folder}${used_go}" -gaf_wo "${int_file_folder}goa_uniprot_all.gaf" \
-        -out_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" ;
+        -out_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -checkpoint "${int_file_folder}goa_uniprot_all_CumulFreq.txt.checkpoint" ${resume_opt} ;
 
         echo 'Produce for each species the list of GO occurrences found' ;
         "${src_folder}"./speciesToGO.py -gaf "${int_file_folder}goa_uniprot_all.gaf" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" \
-        -names "${taxonomy_folder}names.dmp" -out "${int_file_folder}speciesGOusage.txt" > "${int_file_folder}speciesGOusage_MISSING_taxon.txt" ;
+        -names "${taxonomy_folder}names.dmp" -out "${int_file_folder}speciesGOusage.txt" -matrix "${int_file_folder}speciesGOusage.bin" -checkpoint "${int_file_folder}speciesGOusage.txt.checkpoint" ${resume_opt} \
+        -missing "${int_file_folder}speciesGOusage_MISSING_taxon.txt" -delnodes "${taxonomy_folder}delnodes.dmp" ;
 
         echo 'Cluster species together and their corresponding GO' ;
-        "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -species "${int_file_folder}speciesGOusage.txt" \
+        "${src_folder}"./clusterTaxon.py -constraints "${tax_constr_def_file}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" -matrix "${int_file_folder}speciesGOusage.bin" \
         -out "${int_file_folder}cluster_speciesGOusage.txt" ;
 
         echo 'Compute the cumulative occurrence of GO terms in defined subdivisions using the graph of GO Memory Less' ;
         "${src_folder}"./speciesFreqCumul.py -owl "${go_folder}${used_go}" -freq "${int_file_folder}cluster_speciesGOusage.txt" \
-        -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" ;
+        -out_freq "${int_file_folder}freqCumul_cluster_speciesGOusage.txt" -sparse -workers "${workers}" ;
 
         echo 'Create never_in considering what we have produced from the cumulated corpus of each subdivision' ;
         "${src_folder}"./createNeverIN.py -goa_freq "${int_file_folder}goa_uniprot_all_CumulFreq.txt" -cutoff "${cut_off}" \
@@ -301,7 +332,7 @@ case "${type}" in
 
         echo 'Wrapper to make output identical' ;
         "${src_folder}"./wrapperTaxonConstraints.py -constraints "${tax_constr_def_file}" -never_in "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.txt" \
-        -out "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN_reformat.txt" ;
+        -db "${int_file_folder}freqCumul_cluster_speciesGOusage_NEVER_IN.db" ;
 
         echo 'Consider taxon constraints from consortium';
         "${src_folder}"./taxonConstraintsGOconsortium.py -owl "${go_folder}${used_go}" -merge "${taxonomy_folder}merged.dmp" -taxa "${taxonomy_folder}nodes.dmp" -names "${taxonomy_folder}names.dmp" \
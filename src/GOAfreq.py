@@ -15,6 +15,7 @@
 import sys, argparse, copy
 from owlready2 import *
 from owlLibrary2 import *
+from gafLibrary import *
 
 
 def main(args):
@@ -22,18 +23,19 @@ def main(args):
     listGO = {}
 
     #parse purged .gaf file
-    with open(args['gaf_wo'], "r") as gaf:
-        for line in gaf:
-            values = line.split("\t")
-            goiter = values[4].replace(":","_")
-            if goiter not in listGO:
-                listGO[goiter] = 1
-            else:
-                listGO[goiter] += 1
-            #END IF
-        #END FOR
-    #END WITH
-    gaf.close()
+    reader = GafReader(args['gaf_wo'], args['checkpoint'], args['checkpoint_every'], args['resume'])
+    if reader.resumed_state() is not None:
+        listGO = reader.resumed_state()
+    #END IF
+    for line in reader.lines(lambda: listGO):
+        values = line.split("\t")
+        goiter = values[4].replace(":","_")
+        if goiter not in listGO:
+            listGO[goiter] = 1
+        else:
+            listGO[goiter] += 1
+        #END IF
+    #END FOR
 
     #obtain cumulative frequencies data for each GO term in GOA
     goowl = GoOwl(args['owl'],"http://purl.obolibrary.org/obo/")
@@ -53,6 +55,7 @@ def main(args):
         #END FOR
     #END WITH
     gafout.close()
+    reader.done()
 #END MAIN
 
 
@@ -63,5 +66,8 @@ if __name__ == '__main__':
     parser.add_argument('-owl', metavar='INPUT_FILE',  help='go-plus.owl file', required=True)
     parser.add_argument('-gaf_wo', metavar='INPUT_FILE',  help='goa_wo_parents.gaf file', required=True)
     parser.add_argument('-out_freq', metavar='OUTPUT_FILE',  help='output file containining statistics: 1) GO cumulated frequencies in GOA, 2) GO occurrences', required=True)
+    parser.add_argument('-checkpoint', metavar='OUTPUT_FILE', help='file where the reading of -gaf_wo is periodically checkpointed (OPTIONAL)', required=False)
+    parser.add_argument('-checkpoint_every', metavar='INTEGER', type=int, default=10000000, help='number of GAF lines between two checkpoints (OPTIONAL, default: 10000000)', required=False)
+    parser.add_argument('-resume', help='continue from the last checkpoint written in -checkpoint (OPTIONAL)', action='store_true', required=False)
     args = vars(parser.parse_args())
     main(args)
@@ -17,6 +17,7 @@
 import sys, argparse, copy, re
 from owlready2 import *
 from taxonLibrary3 import *
+from goaMatrixLibrary import *
 
 
 def main(args):
@@ -41,90 +42,25 @@ def main(args):
         #END FOR
     #END WITH
     constraints.close()
-    TotalCount = {}
-    GO = {}
-    taxon = ''
-    status = False
-    with open(args['species'],'r') as species:
-        for line in species:
-            if line.startswith('>'):
-                if taxon:
-                    parent = ''
-                    ## check if it must be clustered
-                    father = taxon
-                    while True:
-                        if father in son_parent.keys():
-                            break
-                        father = Taxa.get_father(father)
-                    parent = son_parent[father]
-                    if parent not in TotalCount:
-                        TotalCount.setdefault(parent,{})
-                            ## END IF
-                        ## END IF
-                    ## END WHILE
-                    for go in GO:
-                        if go not in TotalCount[parent]:
-                            TotalCount[parent].setdefault(go,{})
-                            TotalCount[parent][go] = {'freq': GO[go]['freq'], 'ev': GO[go]['ev'], 'subont': GO[go]['subont'], 'database': GO[go]['database']}
-                        else:
-                            TotalCount[parent][go]['freq'] += GO[go]['freq']
-                            if TotalCount[parent][go]['ev'] == 'IEA' and GO[go]['ev'] != 'IEA':
-                                TotalCount[parent][go]['ev'] = GO[go]['ev']
-                            if TotalCount[parent][go]['database'] == 'P' and GO[go]['database'] == 'N':
-                                TotalCount[parent][go]['database'] = 'N'
-                            #END IF
-                        #END IF
-                    #END FOR
-                    GO.clear()
-                    status = False
-                ## END IF
-                line = line.strip()
-                taxon = line.replace('>','').strip()
-            else:
-                ### take GOs and freq
-                status = True
-                GOval = line.split("\t")
-                GO[GOval[0].strip()] = {'freq': int(GOval[1].strip()), 'ev': GOval[2].strip(), 'subont': GOval[3].strip(), 'database': GOval[4].strip()}
-            ## END IF
-        ## END FOR
-    ## END WITH
-    if status:
-        if taxon:
-            parent = ''
-            ## check if it must be clustered
-            father = taxon
-            while True:
-                if father in son_parent.keys():
-                    break
-                father = Taxa.get_father(father)
-            parent = son_parent[father]
-            if parent not in TotalCount:
-                TotalCount.setdefault(parent,{})
-            for go in GO:
-                if go not in TotalCount[parent]:
-                    TotalCount[parent].setdefault(go,{})
-                    TotalCount[parent][go] = {'freq': GO[go]['freq'], 'ev': GO[go]['ev'], 'subont': GO[go]['subont'], 'database': GO[go]['database']}
-                else:
-                    TotalCount[parent][go]['freq'] += GO[go]['freq']
-                    if TotalCount[parent][go]['ev'] == 'IEA' and GO[go]['ev'] != 'IEA':
-                        TotalCount[parent][go]['ev'] = GO[go]['ev']
-                    if TotalCount[parent][go]['database'] == 'P' and GO[go]['database'] == 'N':
-                        TotalCount[parent][go]['database'] = 'N'
-            GO.clear()
-            status = False
+    if args['matrix'] is not None:
+        speciesGO = GOAMatrix(args['matrix'])
+    elif args['species'] is not None:
+        speciesGO = read_usage(args['species'])
+    else:
+        print("ERROR: one of -species or -matrix is required")
+        sys.exit(1)
+    #END IF
+    ## reference node clustering each species, from one top-down pass over the taxonomy
+    groups = []
+    for taxon, father in zip(speciesGO.get_taxa(), Taxa.get_nearest_references(speciesGO.get_taxa(), son_parent.keys())):
+        if father is None:
+            print(f"WARNING: {taxon} is not under any taxon of {args['constraints']}, not clustered")
+            groups.append(None)
+        else:
+            groups.append(son_parent[father])
         ## END IF
-    ## END IF
-    species.close()
-    with open(args['out'],'w') as out:
-        for group in TotalCount:
-            goList = TotalCount[group]
-            out.write(f">{group}\n")
-            for goTerm in sorted(goList):
-                out.write(f"{goTerm}\t{goList[goTerm]['freq']}\t{goList[goTerm]['ev']}\t{goList[goTerm]['subont']}\t{goList[goTerm]['database']}\n")
-            ##END FOR
-        ##END FOR
-    ##END WITH
-    out.close()
+    ## END FOR
+    speciesGO.group_by(groups).write_usage(args['out'])
 #END MAIN
 
 
@@ -133,7 +69,8 @@ def main(args):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Takes the output in mulfasta format of the script speciesToGO.py and the hand made file taxonConstraintsDef.txt where taxonomy hierarchy is subdivided')
     parser.add_argument('-constraints', metavar='INPUT_FILE',  help='taxonConstraintsDef.txt file containing top taxa where to cluster species', required=True)
-    parser.add_argument('-species', metavar='INPUT_FILE',  help='file output of speciesToGO.py where each species and its GOs are reported in mulfasta format', required=True)
+    parser.add_argument('-species', metavar='INPUT_FILE',  help='file output of speciesToGO.py where each species and its GOs are reported in mulfasta format (required if -matrix is not given)', required=False)
+    parser.add_argument('-matrix', metavar='INPUT_FILE',  help='binary matrix written by speciesToGO.py -matrix, used instead of -species', required=False)
     parser.add_argument('-out', metavar='OUTPUT_FILE',  help='txt file containing output', required=True)
     parser.add_argument('-merge', metavar='INPUT_FILE',  help='merged.dmp file where some taxa have been substitued with others', required=True)
     parser.add_argument('-taxa', metavar='INPUT_FILE',  help='nodes.dmp file containining taxa from Taxonomy', required=True)
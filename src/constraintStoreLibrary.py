@@ -0,0 +1,116 @@
+# -------------------------------------------------------------------------------
+# Name:        constraint store library
+# Purpose:     SQLite store of the automatic NEVER_IN constraints: the GO set of
+#              each taxonomy subdivision stored once, and the reference taxa
+#              pointing to their subdivision
+#
+# Author:      Stefano - Emilio - Ermanno
+#
+# Created:     19/10/2026
+# Copyright:   (c) Stefano 2019
+# Licence:     GPL
+# -------------------------------------------------------------------------------
+
+import os
+import sqlite3
+
+SCHEMA = '''
+CREATE TABLE clusters (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE gos (id INTEGER PRIMARY KEY, go TEXT UNIQUE NOT NULL, name TEXT, namespace TEXT);
+CREATE TABLE never_in (cluster INTEGER NOT NULL, go INTEGER NOT NULL);
+CREATE TABLE taxa (taxon TEXT NOT NULL, name TEXT, cluster INTEGER NOT NULL);
+'''
+# built once all the rows are in, faster than updating them at each insert
+INDEXES = '''
+CREATE INDEX never_in_cluster ON never_in (cluster);
+CREATE INDEX taxa_taxon ON taxa (taxon);
+CREATE INDEX taxa_cluster ON taxa (cluster);
+'''
+
+
+class ConstraintStore:
+    def __init__(self, db_file, create=False):
+        # create=True replaces db_file with an empty store
+        if create and os.path.exists(db_file):
+            os.remove(db_file)
+        # END IF
+        if not create and not os.path.exists(db_file):
+            raise FileNotFoundError(f'{db_file} is not a constraint store')
+        # END IF
+        self.__db = sqlite3.connect(db_file)
+        self.__clusters = {}
+        self.__gos = {}
+        if create:
+            self.__db.executescript(SCHEMA)
+        # END IF
+
+    # END DEF
+
+    def __cluster_id(self, cluster):
+        if cluster not in self.__clusters:
+            self.__clusters[cluster] = self.__db.execute('INSERT INTO clusters (name) VALUES (?)', (cluster,)).lastrowid
+        # END IF
+
+        return self.__clusters[cluster]
+    # END DEF
+
+
+    def add_never_in(self, cluster, gos):
+        # gos: (go, name, namespace) never in the subdivision cluster, in output order
+        cluster_id = self.__cluster_id(cluster)
+        rows = []
+        for go, name, namespace in gos:
+            if go not in self.__gos:
+                self.__gos[go] = self.__db.execute('INSERT INTO gos (go, name, namespace) VALUES (?, ?, ?)', (go, name, namespace)).lastrowid
+            # END IF
+            rows.append((cluster_id, self.__gos[go]))
+        # END FOR
+        self.__db.executemany('INSERT INTO never_in (cluster, go) VALUES (?, ?)', rows)
+    # END DEF
+
+
+    def add_taxon(self, taxon, name, cluster):
+        # reference taxon of the subdivision cluster
+        self.__db.execute('INSERT INTO taxa (taxon, name, cluster) VALUES (?, ?, ?)', (taxon, name, self.__cluster_id(cluster)))
+    # END DEF
+
+
+    def close(self, commit=True):
+        if commit:
+            self.__db.executescript(INDEXES)
+            self.__db.commit()
+        # END IF
+        self.__db.close()
+    # END DEF
+
+
+    def get_never_in(self, taxon):
+        # set of the GO never in the reference taxon
+        cursor = self.__db.execute('SELECT DISTINCT gos.go FROM taxa JOIN never_in ON never_in.cluster = taxa.cluster '
+                                   'JOIN gos ON gos.id = never_in.go WHERE taxa.taxon = ?', (taxon,))
+
+        return set(row[0] for row in cursor)
+    # END DEF
+
+
+    def get_taxa(self):
+        return set(row[0] for row in self.__db.execute('SELECT DISTINCT taxon FROM taxa'))
+    # END DEF
+
+
+    def iter_lines(self):
+        # lines of the legacy wrapperTaxonConstraints.py output, in the same order
+        taxa = {}
+        for taxon, name, cluster in self.__db.execute('SELECT taxon, name, cluster FROM taxa ORDER BY rowid'):
+            taxa.setdefault(cluster, []).append((taxon, name))
+        # END FOR
+        cursor = self.__db.execute('SELECT never_in.cluster, gos.go, gos.name, gos.namespace FROM never_in '
+                                   'JOIN gos ON gos.id = never_in.go ORDER BY never_in.rowid')
+        for cluster, go, go_name, namespace in cursor:
+            for taxon, name in taxa.get(cluster, ()):
+                yield f'{go}\t{go_name}\t{namespace}\t{taxon}\t{name}\tNever in taxon\n'
+            # END FOR
+        # END FOR
+    # END DEF
+
+# END CLASS
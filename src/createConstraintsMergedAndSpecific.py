@@ -20,6 +20,7 @@ import types
 import urllib.request
 from taxonLibrary3 import *
 from owlLibrary2 import *
+from constraintStoreLibrary import *
 from os.path import join
 
 try:
@@ -92,9 +93,9 @@ def find_new_taxon(taxonomy, taxid):
 
         taxa_status = 'deleted'
         new_taxon_ids = taxonomy.get_ids(taxa_name)
-        if taxa_level is not None:
-            for tax_id in new_taxon_ids:
-                parent = taxonomy.get_ancestor_at_rank(tax_id, taxa_level)
+        if taxa_level is not None and new_taxon_ids is not None:
+            # first candidate having an ancestor at the rank of the deleted taxon
+            for parent in taxonomy.get_ancestors_at_rank(new_taxon_ids, taxa_level):
                 if parent is not None:
                     new_taxa = parent
                     break
@@ -121,7 +122,6 @@ def main(args):
     import_list = imports()
     taxa = Taxon(args['taxa'],args['merge'],args['names'])
     ancestors = taxa.ancestors_full_list()
-    descendants = taxa.descendants_full_list()
     merge_delete = 0
     tax_constr_def = []
     ref_nodes = set()
@@ -281,6 +281,13 @@ def main(args):
                 if line[3] in list_of_constraints_per_species_auto:
                     list_of_constraints_per_species_auto[line[3]].add(line[0])
 
+    if args['aut_db'] is not None:
+        aut_db = ConstraintStore(args['aut_db'])
+        for taxon in aut_db.get_taxa():
+            if taxon in list_of_constraints_per_species_auto:
+                list_of_constraints_per_species_auto[taxon].update(aut_db.get_never_in(taxon))
+        aut_db.close(commit=False)
+
     add_never_in_manual = dict()
     add_in_manual = dict()
     never_from_only = dict()
@@ -332,10 +339,6 @@ def main(args):
                             list_of_constraints_per_species_MANUAL[taxon]['NEVER_IN'] = dict()
                             list_of_constraints_per_species_MANUAL[taxon]['IN'] = dict()
                         ##END IF
-                        try:
-                            desc = descendants[taxon]
-                        except KeyError:
-                            desc = set()
                         anc = ancestors[taxon]
                         if values[3] in anc or taxon == values[3]:
                             list_of_constraints_per_species_MANUAL[taxon]['IN'][values[0]] = values[3]
@@ -388,13 +391,13 @@ def main(args):
 
     #merge automatic, consortium and manual constrains and solve exceptions derived from only-in and in taxon constraints
 
+    ## reference node of each species, from one top-down pass over the taxonomy
+    auto_reference = dict(zip(list_of_species, taxa.get_nearest_references(list_of_species, list_of_constraints_per_species_auto.keys())))
     for taxon in list_of_species:
-        tax = taxon
-        while True:
-            if tax in list_of_constraints_per_species_auto:
-                break
-            tax = taxa.get_father(tax)
-        for go in list_of_constraints_per_species_auto[tax]:
+        tax = auto_reference[taxon]
+        if tax is None:
+            log_file.write(f'WARNING: {taxon} is not under any taxon of {args["partition"]}, no automatic constraints\n')
+        for go in list_of_constraints_per_species_auto.get(tax, set()):
             if go not in add_in_manual[taxon] and go not in list_of_constraints_per_species_go[taxon]['ONLY_IN']:
                 details = go_owl.go_single_details(go)
                 never_in_def[taxon][go] = (details['name'],details['namespace'])
@@ -445,6 +448,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='merge constraints from automatic procedure, GO consortium, and manual (optional) constraints for each species specified in a file (option -list). Store results in a directory (-outdir)')
     parser.add_argument('-go_const', metavar='INPUT_FILE',  help='constraints from GO consortium generated by taxonConstraintsGOconsortium.py', required=False)
     parser.add_argument('-aut_const', metavar='INPUT_FILE',  help='automatic GO constraints generated by wrapperTaxonConstraints.py', required=False)
+    parser.add_argument('-aut_db', metavar='INPUT_FILE',  help='automatic GO constraints stored by wrapperTaxonConstraints.py -db, used instead of -aut_const', required=False)
     parser.add_argument('-manual', metavar='INPUT_FILE',  help='NEVER_IN constraints manually defined (go <tab> taxid) (optional)', required=False)
     parser.add_argument('-owl', metavar='INPUT_FILE', help='go-plus.owl file is required', required=True)
     parser.add_argument('-list', metavar='INPUT_FILE',  help='list of species for which generate merged constraints', required=True)
@@ -12,14 +12,74 @@
 # Licence:     GPL
 #-------------------------------------------------------------------------------
 
-import sys, argparse, copy
+import sys, argparse, copy, os
 from owlready2 import *
 from owlLibrary2 import *
 
+def read_cumul(cumul_file, GO):
+    ## subdivisions of speciesFreqCumul.py output in file order: (header, {go: (cumulated freq, database)})
+    ## keeping only the GO in GO
+    clusters = []
+    with open(cumul_file, "r") as cumul:
+        for line in cumul:
+            line = line.strip()
+            if line.startswith('>'):
+                clusters.append((line, {}))
+            else:
+                GOval = line.split("\t")
+                if GOval[0] in GO:
+                    clusters[-1][1][GOval[0]] = (int(GOval[1]), GOval[5])
+                ##END IF
+            ##END IF
+        ##END FOR
+    ##END WITH
+    cumul.close()
+
+    return clusters
+##END DEF
+
+def never_in_seeds(clusters, GO, listing):
+    ## for each GO of the cutoff the bitset of the subdivisions where it was never found (or found once and
+    ## only from PANTHER, Pfam or InterPro); a GO of the ontology without row in a subdivision
+    ## (speciesFreqCumul.py -sparse) has cumulated freq 0
+    seeds = {}
+    for go in GO:
+        mask = 0
+        for bit, (header, rows) in enumerate(clusters):
+            if go in rows:
+                cumul, pant = rows[go]
+            elif go in listing:
+                cumul, pant = 0, 'N'
+            else:
+                continue
+            ##END IF
+            if cumul == 0 or (cumul == 1 and pant == 'P'):
+                mask |= 1 << bit
+            ##END IF
+        ##END FOR
+        if mask:
+            seeds[go] = mask
+        ##END IF
+    ##END FOR
+
+    return seeds
+##END DEF
+
+def cutoff_file(out_file, cutoff, cutoffs):
+    ## output file of one cutoff: out_file itself for a single cutoff, otherwise out_file with _cutoff<N>
+    if len(cutoffs) == 1:
+        return out_file
+    ##END IF
+    root, ext = os.path.splitext(out_file)
+
+    return f'{root}_cutoff{cutoff}{ext}'
+##END DEF
+
 def main(args):
 
-    ## load list of GO that can be used to define constraints
+    ## load list of GO that can be used to define constraints with the lowest cutoff
     GO = {}
+    cutoffs = sorted(set(args['cutoff']))
     goowl = GoOwl(args['owl'],'http://purl.obolibrary.org/obo/')
     with open(args['goa_freq'], "r") as goafreq:
         for line in goafreq:
@@ -28,7 +88,7 @@ def main(args):
                 continue
             ##END IF
             values = line.split("\t")
-            if int(values[6]) >= args['cutoff']:
+            if int(values[6]) >= cutoffs[0]:
                 GO[values[0]] = {'freq': values[6], 'desc': values[1], 'subont': values[2]}
             ##END IF
         ##END FOR
@@ -37,53 +97,49 @@ def main(args):
 
 
 
-    ## open cumulated freq of the subdivisions and create never_in
+    ## open cumulated freq of the subdivisions and create never_in: the never_in of all the subdivisions
+    ## and all the cutoffs at once, propagating to the descendants of each seed GO the bitset of its
+    ## subdivisions. Bit level * len(clusters) + cluster is set when the GO is a seed at cutoffs[level],
+    ## i.e. when its GOA frequency is at least cutoffs[level]
 
-    go_list = set()
-    with open(args['out'], "w") as out:
-        with open(args['cumul'], "r") as cumul:
-            for line in cumul:
-                line = line.strip()
-                if line.startswith('>'):
-                    if go_list:
-                        for go in go_list:
-                            details = goowl.go_single_details(go)
-                            out.write(f'{go}\tnever_in\t{details["name"]}\t{details["namespace"]}\n')
-                    out.write(f'{line}\n')
-                    go_list.clear()
-                else:
-                    GOval = line.split("\t")
-                    ##print(GOval[0])
-                    if GOval[0] in GO:
-                        if int(GOval[1]) == 0:
-                            go_list.add(GOval[0])
-                            descendants = goowl.go_descendants_using_valid_edges(GOval[0])
-                            for items in descendants.keys():
-                                go_list.add(items)
-                            #out.write(f'{GOval[0]}\tnever_in\t{GO[GOval[0]]["desc"]}\t{GO[GOval[0]]["subont"]}\n')
-                        if int(GOval[1]) == 1 and GOval[5] == 'P':
-                            go_list.add(GOval[0])
-                            descendants = goowl.go_descendants_using_valid_edges(GOval[0])
-                            for items in descendants.keys():
-                                go_list.add(items)
-            for go in go_list:
-                details = goowl.go_single_details(go)
-                out.write(f'{go}\tnever_in\t{details["name"]}\t{details["namespace"]}\n')
-                        ##END IF
-                    ##END IF
-                ##END IF
+    clusters = read_cumul(args['cumul'], GO)
+    seeds = never_in_seeds(clusters, GO, goowl.listing())
+    for go in seeds:
+        mask = 0
+        for level, cutoff in enumerate(cutoffs):
+            if int(GO[go]['freq']) >= cutoff:
+                mask |= seeds[go] << (level * len(clusters))
+            ##END IF
+        ##END FOR
+        seeds[go] = mask
+    ##END FOR
+    never_in = goowl.propagate_to_descendants(seeds)
+    lines = [[] for level in cutoffs for cluster in clusters]
+    for go in sorted(never_in):
+        details = goowl.go_single_details(go)
+        mask = never_in[go]
+        while mask:
+            bit = (mask & -mask).bit_length() - 1
+            lines[bit].append(f'{go}\tnever_in\t{details["name"]}\t{details["namespace"]}\n')
+            mask &= mask - 1
+        ##END WHILE
+    ##END FOR
+    for level, cutoff in enumerate(cutoffs):
+        with open(cutoff_file(args['out'], cutoff, cutoffs), "w") as out:
+            for bit, (header, rows) in enumerate(clusters):
+                out.write(f'{header}\n')
+                out.writelines(lines[level * len(clusters) + bit])
             ##END FOR
         ##END WITH
-    ##END WITH
-    cumul.close()
-    out.close()
+        out.close()
+    ##END FOR
 ##END DEF
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Create GO cumulated frequencies in GOA and GO occurrences in GOA')
     parser.add_argument('-goa_freq', metavar='INPUT_FILE',  help='GOAfreq file generated by GOAfreq.py', required=True)
     parser.add_argument('-owl', metavar='INPUT_FILE', help='go-plus.owl file', required=True)
-    parser.add_argument('-cutoff', metavar='INTEGER', type=int, help='cutoff of GO occurrence to be considered as potential constraint (integer)', required=True)
+    parser.add_argument('-cutoff', metavar='INTEGER', type=int, nargs='+', help='cutoff of GO occurrence to be considered as potential constraint (integer). With more cutoffs one output is written for each of them, adding _cutoff<N> to the -out file name', required=True)
     parser.add_argument('-cumul', metavar='INPUT_FILE',  help='input file generated by the script speciesFreqCumul.py containing cumulated frequencies in GOA', required=True)
     parser.add_argument('-out', metavar='OUTPUT_FILE',  help='output file containining the never_in GO for each subdivision', required=True)
     args = vars(parser.parse_args())
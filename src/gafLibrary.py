@@ -0,0 +1,125 @@
+# -------------------------------------------------------------------------------
+# Name:        GAF library
+# Purpose:     reading GAF files with periodic checkpoints so that a pass
+#              over goa_uniprot_all.gaf can be resumed after a crash
+#
+# Author:      Stefano - Emilio - Ermanno
+#
+# Created:     19/10/2026
+# Copyright:   (c) Stefano 2019
+# Licence:     GPL
+# -------------------------------------------------------------------------------
+
+import os
+import pickle
+
+
+class GafReader:
+    def __init__(self, gaf_file, checkpoint=None, every=10000000, resume=False, settings=None):
+        # settings: options of the caller that change the outputs (e.g. their number), a checkpoint
+        # saved with different settings is not resumed
+        self.__gaf_file = gaf_file
+        self.__settings = settings
+        self.__checkpoint_file = checkpoint
+        self.__every = every
+        self.__saved = None
+        if resume and checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint, 'rb') as fin:
+                saved = pickle.load(fin)
+            # END WITH
+            # a checkpoint of another GAF (or of another release of it) can not be resumed
+            if saved['gaf'] != os.path.abspath(gaf_file) or saved['size'] != os.path.getsize(gaf_file):
+                print(f'WARNING: checkpoint {checkpoint} does not match {gaf_file}, starting from the beginning')
+            elif saved.get('settings') != settings:
+                print(f'WARNING: checkpoint {checkpoint} was saved with {saved.get("settings")} instead of {settings}, starting from the beginning')
+            else:
+                self.__saved = saved
+            # END IF
+        # END IF
+
+    # END DEF
+
+    def resumed_state(self):
+        # partial state saved by the last checkpoint, None when starting from byte 0
+        if self.__saved is None:
+            return None
+        # END IF
+
+        return self.__saved['state']
+    # END DEF
+
+
+    def open_output(self, out_file, index=0):
+        # open the index-th output file, truncated to the position recorded by the last checkpoint when resuming
+        if self.__saved is None:
+            return open(out_file, 'w')
+        # END IF
+
+        out = open(out_file, 'r+')
+        out.truncate(self.__saved['outputs'][index])
+        out.seek(self.__saved['outputs'][index])
+
+        return out
+    # END DEF
+
+
+    def lines(self, state=None, outputs=()):
+        # yield the lines of the GAF file starting from the last checkpoint. Every self.__every lines
+        # state() (the partial result of the caller) and the position of the outputs are saved;
+        # the line just yielded is always consumed by the caller when the next one is requested
+        offset = 0
+        count = 0
+        if self.__saved is not None:
+            offset = self.__saved['offset']
+            count = self.__saved['lines']
+        # END IF
+
+        with open(self.__gaf_file, 'rb') as gaf:
+            gaf.seek(offset)
+            for raw in gaf:
+                if self.__checkpoint_file is not None and count > 0 and count % self.__every == 0:
+                    self.__save(offset, count, state, outputs)
+                # END IF
+                offset += len(raw)
+                count += 1
+                yield raw.decode('utf-8')
+            # END FOR
+        # END WITH
+        gaf.close()
+    # END DEF
+
+
+    def done(self):
+        # the pass is complete, the checkpoint is no longer needed
+        if self.__checkpoint_file is not None and os.path.exists(self.__checkpoint_file):
+            os.remove(self.__checkpoint_file)
+        # END IF
+    # END DEF
+
+
+    def __save(self, offset, count, state, outputs):
+        positions = []
+        for out in outputs:
+            out.flush()
+            positions.append(out.tell())
+        # END FOR
+
+        saved = {'gaf': os.path.abspath(self.__gaf_file),
+                 'size': os.path.getsize(self.__gaf_file),
+                 'settings': self.__settings,
+                 'offset': offset,
+                 'lines': count,
+                 'state': state() if state is not None else None,
+                 'outputs': positions
+                 }
+        # write aside and rename, a crash while saving leaves the previous checkpoint intact
+        tmp_file = self.__checkpoint_file + '.tmp'
+        with open(tmp_file, 'wb') as fout:
+            pickle.dump(saved, fout, protocol=pickle.HIGHEST_PROTOCOL)
+            fout.flush()
+            os.fsync(fout.fileno())
+        # END WITH
+        os.replace(tmp_file, self.__checkpoint_file)
+    # END DEF
+
+# END CLASS
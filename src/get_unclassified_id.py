@@ -4,7 +4,7 @@ from taxonLibrary3 import *
 import argparse
 
 
-def main():
+def main(args):
     nodes = []
     taxa = Taxon(args['taxa'],args['merge'],args['names'])
     with open(args['constraints'],'r') as input:
@@ -15,26 +15,21 @@ def main():
             if rank == 'order':
                 nodes.append(line[0])
     descendants_full = taxa.get_all_descendants('1')
-    descendants_nodes = set()
     list = ['environmental samples','unclassified','uncultured','Candidatus','candidate','incertae sedis',' x ',' vector','plasmid','Plasmid','Vector']
-    for values in nodes:
-        desc = taxa.get_all_descendants(values)
-        descendants_nodes.add(values)
-        for value in desc:
-            descendants_nodes.add(value)
+    descendants_nodes = set(taxa.iter_descendants_many(nodes, include_roots=True))
     descendants_remain = descendants_full - descendants_nodes
     excluded = set()
+    expanded = set()
     for rows in descendants_remain:
         father = taxa.get_father(rows)
         namef = taxa.get_name(father)
         namer = taxa.get_name(rows)
         if any(c in namer for c in list):
             excluded.add(rows)
-        if any(d in namef for d in list):
+        if any(d in namef for d in list) and father not in expanded:
+            expanded.add(father)
             excluded.add(father)
-            sons = taxa.get_all_descendants(father)
-            for x in sons:
-                excluded.add(x)
+            excluded.update(taxa.iter_descendants(father))
     with open(args['out'],'w') as out:
         for row in excluded:
             name = taxa.get_name(row)
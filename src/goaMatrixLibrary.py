@@ -0,0 +1,358 @@
+# -------------------------------------------------------------------------------
+# Name:        GOA matrix library
+# Purpose:     sparse taxon x GO matrix of GOA annotation counts with best
+#              evidence code, namespace and database flag of each pair
+#
+# Author:      Stefano - Emilio - Ermanno
+#
+# Created:     19/10/2026
+# Copyright:   (c) Stefano 2019
+# Licence:     GPL
+# -------------------------------------------------------------------------------
+
+import sys
+import json
+from array import array
+
+MAGIC = b'FTXGOAM1'
+# database flag of a pair: 'N' as soon as one annotation does not come from PANTHER, Pfam or InterPro
+DATABASE_FLAGS = ('N', 'P')
+
+
+class GOAMatrix:
+    def __init__(self, matrix_file=None):
+        self.__taxa = []
+        self.__gos = []
+        self.__evidences = []
+        self.__namespaces = []
+        self.__taxon_index = {}
+        self.__go_index = {}
+        self.__evidence_index = {}
+        self.__namespace_index = {}
+        # parallel arrays, one element for each (taxon, GO) pair
+        self.__rows = array('i')
+        self.__cols = array('i')
+        self.__counts = array('q')
+        self.__evidence = array('B')
+        self.__namespace = array('B')
+        self.__database = array('B')
+        # (row, col) -> pair, only needed while the matrix is built
+        self.__pairs = {}
+        # row_offsets[r]:row_offsets[r + 1] are the pairs of row r once the matrix is sorted
+        self.__row_offsets = None
+        if matrix_file is not None:
+            self.__load(matrix_file)
+        # END IF
+
+    # END DEF
+
+    def __code(self, value, table, index):
+        if value not in index:
+            index[value] = len(table)
+            table.append(value)
+        # END IF
+
+        return index[value]
+    # END DEF
+
+
+    def add(self, taxon, go, evidence, namespace, database):
+        # add one GOA annotation: the first one sets evidence and namespace of the pair, then
+        # any non IEA evidence replaces it and database 'N' wins over 'P'
+        row = self.__code(taxon, self.__taxa, self.__taxon_index)
+        col = self.__code(go, self.__gos, self.__go_index)
+        key = (row << 24) | col
+        pair = self.__pairs.get(key)
+        if pair is None:
+            self.__pairs[key] = len(self.__rows)
+            self.__rows.append(row)
+            self.__cols.append(col)
+            self.__counts.append(1)
+            self.__evidence.append(self.__code(evidence, self.__evidences, self.__evidence_index))
+            self.__namespace.append(self.__code(namespace, self.__namespaces, self.__namespace_index))
+            self.__database.append(DATABASE_FLAGS.index(database))
+        else:
+            if evidence != 'IEA':
+                self.__evidence[pair] = self.__code(evidence, self.__evidences, self.__evidence_index)
+            # END IF
+            if database != 'P':
+                self.__database[pair] = 0
+            # END IF
+            self.__counts[pair] += 1
+        # END IF
+        self.__row_offsets = None
+    # END DEF
+
+
+    def add_pair(self, taxon, go, count, evidence, namespace, database):
+        # add an already aggregated (taxon, GO) pair, e.g. a line of speciesGOusage.txt
+        row = self.__code(taxon, self.__taxa, self.__taxon_index)
+        col = self.__code(go, self.__gos, self.__go_index)
+        self.__pairs[(row << 24) | col] = len(self.__rows)
+        self.__rows.append(row)
+        self.__cols.append(col)
+        self.__counts.append(count)
+        self.__evidence.append(self.__code(evidence, self.__evidences, self.__evidence_index))
+        self.__namespace.append(self.__code(namespace, self.__namespaces, self.__namespace_index))
+        self.__database.append(DATABASE_FLAGS.index(database))
+        self.__row_offsets = None
+    # END DEF
+
+
+    def merge(self, other):
+        # add the pairs of another matrix as if its annotations had been added after the ones of this
+        # matrix: counts are summed, a non IEA evidence of other replaces the evidence of the pair,
+        # database 'N' wins over 'P' and the namespace of the first pair is kept
+        if self.__row_offsets is not None:
+            # a sorted matrix has dropped the index of its pairs
+            self.__pairs = {(self.__rows[p] << 24) | self.__cols[p]: p for p in range(len(self.__rows))}
+        # END IF
+        for taxon in other.get_taxa():
+            self.add_taxon(taxon)
+        # END FOR
+        rows, cols, counts, evidence, namespace, database = other.get_arrays()
+        taxa, gos, evidences, namespaces = other.get_taxa(), other.get_gos(), other.get_evidences(), other.get_namespaces()
+        for p in range(len(rows)):
+            row = self.__taxon_index[taxa[rows[p]]]
+            col = self.__code(gos[cols[p]], self.__gos, self.__go_index)
+            pair = self.__pairs.get((row << 24) | col)
+            if pair is None:
+                self.add_pair(taxa[rows[p]], gos[cols[p]], counts[p], evidences[evidence[p]],
+                              namespaces[namespace[p]], DATABASE_FLAGS[database[p]])
+            else:
+                if evidences[evidence[p]] != 'IEA':
+                    self.__evidence[pair] = self.__code(evidences[evidence[p]], self.__evidences, self.__evidence_index)
+                # END IF
+                self.__database[pair] = min(self.__database[pair], database[p])
+                self.__counts[pair] += counts[p]
+            # END IF
+        # END FOR
+        self.__row_offsets = None
+    # END DEF
+
+
+    def add_taxon(self, taxon):
+        # a row without pairs (a taxon with no GO)
+        return self.__code(taxon, self.__taxa, self.__taxon_index)
+    # END DEF
+
+
+    def sort(self):
+        # canonical order: rows in order of first appearance, GO sorted inside each row
+        if self.__row_offsets is not None:
+            return
+        # END IF
+
+        order = sorted(range(len(self.__rows)), key=lambda p: (self.__rows[p], self.__gos[self.__cols[p]]))
+        self.__rows = array('i', (self.__rows[p] for p in order))
+        self.__cols = array('i', (self.__cols[p] for p in order))
+        self.__counts = array('q', (self.__counts[p] for p in order))
+        self.__evidence = array('B', (self.__evidence[p] for p in order))
+        self.__namespace = array('B', (self.__namespace[p] for p in order))
+        self.__database = array('B', (self.__database[p] for p in order))
+        self.__pairs = {}
+        self.__row_offsets = array('q', [0] * (len(self.__taxa) + 1))
+        for row in self.__rows:
+            self.__row_offsets[row + 1] += 1
+        # END FOR
+        for row in range(len(self.__taxa)):
+            self.__row_offsets[row + 1] += self.__row_offsets[row]
+        # END FOR
+    # END DEF
+
+
+    def get_taxa(self):
+        return self.__taxa
+    # END DEF
+
+
+    def get_gos(self):
+        return self.__gos
+    # END DEF
+
+
+    def get_evidences(self):
+        return self.__evidences
+    # END DEF
+
+
+    def get_namespaces(self):
+        return self.__namespaces
+    # END DEF
+
+
+    def get_arrays(self):
+        # rows, cols, counts, evidence codes, namespace codes and database flags of all the pairs
+        self.sort()
+
+        return self.__rows, self.__cols, self.__counts, self.__evidence, self.__namespace, self.__database
+    # END DEF
+
+
+    def get_row_offsets(self):
+        self.sort()
+
+        return self.__row_offsets
+    # END DEF
+
+
+    def iter_rows(self):
+        # yield for each taxon the dictionary of its GO as built by clusterTaxon.py from speciesGOusage.txt
+        self.sort()
+        for row, taxon in enumerate(self.__taxa):
+            go_list = {}
+            for p in range(self.__row_offsets[row], self.__row_offsets[row + 1]):
+                go_list[self.__gos[self.__cols[p]]] = {'freq': self.__counts[p],
+                                                       'ev': self.__evidences[self.__evidence[p]],
+                                                       'subont': self.__namespaces[self.__namespace[p]],
+                                                       'database': DATABASE_FLAGS[self.__database[p]]
+                                                       }
+            # END FOR
+            yield taxon, go_list
+        # END FOR
+    # END DEF
+
+
+    def group_by(self, groups):
+        # matrix of the groups: groups[row] is the group (e.g. the cluster) of taxon row, None to leave
+        # it out. Rows are the groups in order of first appearance; each (group, GO) pair sums the
+        # counts, keeps the first evidence code that is not IEA (IEA if there is none), the first
+        # namespace, and database 'N' if any of its taxa has it
+        self.sort()
+        grouped = GOAMatrix()
+        group_rows = array('i', (grouped.add_taxon(group) if group is not None else -1 for group in groups))
+        # one key per pair of the grouped taxa: pairs with the same group and GO become adjacent,
+        # in taxon order thanks to the stable sort
+        width = len(self.__gos)
+        pairs = [p for p in range(len(self.__rows)) if group_rows[self.__rows[p]] != -1]
+        keys = array('q', (group_rows[self.__rows[p]] * width + self.__cols[p] for p in pairs))
+        order = sorted(range(len(pairs)), key=keys.__getitem__)
+        iea = self.__evidence_index.get('IEA', -1)
+        run = 0
+        while run < len(order):
+            key = keys[order[run]]
+            first = pairs[order[run]]
+            count = 0
+            evidence = -1
+            database = len(DATABASE_FLAGS) - 1
+            end = run
+            while end < len(order) and keys[order[end]] == key:
+                p = pairs[order[end]]
+                count += self.__counts[p]
+                if evidence == -1 and self.__evidence[p] != iea:
+                    evidence = self.__evidence[p]
+                # END IF
+                database = min(database, self.__database[p])
+                end += 1
+            # END WHILE
+            if evidence == -1:
+                evidence = self.__evidence[first]
+            # END IF
+            grouped.add_pair(grouped.get_taxa()[key // width], self.__gos[key % width], count, self.__evidences[evidence],
+                             self.__namespaces[self.__namespace[first]], DATABASE_FLAGS[database])
+            run = end
+        # END WHILE
+
+        return grouped
+    # END DEF
+
+
+    def write_usage(self, out_file):
+        # multi FASTA like text format of speciesGOusage.txt
+        with open(out_file, 'w') as out:
+            for taxon, go_list in self.iter_rows():
+                out.write(f'>{taxon}\n')
+                for go, details in go_list.items():
+                    if go.startswith('GO'):
+                        out.write(f'{go}\t{details["freq"]}\t{details["ev"]}\t{details["subont"]}\t{details["database"]}\n')
+                    # END IF
+                # END FOR
+            # END FOR
+        # END WITH
+        out.close()
+    # END DEF
+
+
+    def write(self, out_file):
+        # binary format: magic, JSON header with the label tables, then the raw arrays
+        self.sort()
+        arrays = [('rows', self.__rows), ('cols', self.__cols), ('counts', self.__counts),
+                  ('evidence', self.__evidence), ('namespace', self.__namespace), ('database', self.__database),
+                  ('row_offsets', self.__row_offsets)]
+        header = {'byteorder': sys.byteorder,
+                  'taxa': self.__taxa,
+                  'gos': self.__gos,
+                  'evidences': self.__evidences,
+                  'namespaces': self.__namespaces,
+                  'arrays': [(name, arr.typecode, len(arr)) for name, arr in arrays]
+                  }
+        header = json.dumps(header).encode('utf-8')
+        with open(out_file, 'wb') as out:
+            out.write(MAGIC)
+            out.write(len(header).to_bytes(8, 'little'))
+            out.write(header)
+            for name, arr in arrays:
+                arr.tofile(out)
+            # END FOR
+        # END WITH
+        out.close()
+    # END DEF
+
+
+    def __load(self, in_file):
+        with open(in_file, 'rb') as fin:
+            if fin.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{in_file} is not a GOA matrix file')
+            # END IF
+            size = int.from_bytes(fin.read(8), 'little')
+            header = json.loads(fin.read(size).decode('utf-8'))
+            loaded = {}
+            for name, typecode, length in header['arrays']:
+                arr = array(typecode)
+                arr.fromfile(fin, length)
+                if header['byteorder'] != sys.byteorder:
+                    arr.byteswap()
+                # END IF
+                loaded[name] = arr
+            # END FOR
+        # END WITH
+        fin.close()
+        self.__taxa = header['taxa']
+        self.__gos = header['gos']
+        self.__evidences = header['evidences']
+        self.__namespaces = header['namespaces']
+        self.__taxon_index = {taxon: i for i, taxon in enumerate(self.__taxa)}
+        self.__go_index = {go: i for i, go in enumerate(self.__gos)}
+        self.__evidence_index = {ev: i for i, ev in enumerate(self.__evidences)}
+        self.__namespace_index = {ns: i for i, ns in enumerate(self.__namespaces)}
+        self.__rows = loaded['rows']
+        self.__cols = loaded['cols']
+        self.__counts = loaded['counts']
+        self.__evidence = loaded['evidence']
+        self.__namespace = loaded['namespace']
+        self.__database = loaded['database']
+        self.__row_offsets = loaded['row_offsets']
+    # END DEF
+
+# END CLASS
+
+
+def read_usage(in_file):
+    # parse a speciesGOusage.txt (or cluster_speciesGOusage.txt) file in a GOAMatrix
+    matrix = GOAMatrix()
+    with open(in_file, 'r') as fin:
+        taxon = ''
+        for line in fin:
+            if line.startswith('>'):
+                taxon = line.strip().replace('>', '').strip()
+                matrix.add_taxon(taxon)
+            else:
+                values = line.split('\t')
+                matrix.add_pair(taxon, values[0].strip(), int(values[1].strip()), values[2].strip(), values[3].strip(), values[4].strip())
+            # END IF
+        # END FOR
+    # END WITH
+    fin.close()
+
+    return matrix
+# END DEF
@@ -113,6 +113,13 @@ class GoOwl:
         self.__triplets_father_son_go_only = {}
         self.__secondary_ids_to_primary = {}
         self.__primary_to_secondary_ids = {}
+        self.__ancestors_paths = {}
+        #  taxon restrictions of go-plus collected while loading: (GO, relation code, taxon) rows,
+        #  relation labels by code and taxon names
+        self.__taxon_constraints = []
+        self.__taxon_relations = []
+        self.__taxon_relation_codes = {}
+        self.__taxon_names = {}
         self.__mf_root = 'GO_0003674'
         self.__bp_root = 'GO_0008150'
         self.__cc_root = 'GO_0005575'
@@ -275,6 +282,12 @@ class GoOwl:
                 #  END TRY
             #  END IF
         #  END FOR
+        #  separate pass, so that an error building the graph of a GO does not lose its taxon restrictions
+        if 'go-plus' in self.__owl:
+            for go_concept in self.__global.values():
+                self.__taxon_restrictions(go_concept)
+            #  END FOR
+        #  END IF
         # return go_load
     #  END DEF
 
@@ -808,6 +821,146 @@ class GoOwl:
         return go_done
     #  END DEF
 
+    def propagate_to_descendants(self, masks):
+        #  masks: GO -> integer used as a bitset (e.g. one bit for each taxon subdivision).
+        #  Returns for each GO the OR of its own mask and of the masks of all the GO it descends from
+        #  through valid edges, i.e. go is in go_descendants_using_valid_edges(g) or is g itself
+        #  for every g with that bit. GO with an empty result are left out
+        seeds = {}
+        for go, mask in masks.items():
+            if go in self.__secondary_ids_to_primary and go not in self.__triplets_father_son:
+                go = self.__secondary_ids_to_primary[go]
+            #  END IF
+            if mask:
+                seeds[go] = seeds.get(go, 0) | mask
+            #  END IF
+        #  END FOR
+        #  downward closure of the seeds and number of valid edges reaching each GO inside it
+        parents = {go: 0 for go in seeds}
+        queue = list(seeds)
+        while queue:
+            vertex = queue.pop()
+            for go_p in self.__triplets_father_son.get(vertex, ()):
+                if go_p[0].startswith("GO_") and go_p[1] in self.__valid_edges:
+                    if go_p[0] not in parents:
+                        parents[go_p[0]] = 0
+                        queue.append(go_p[0])
+                    #  END IF
+                    parents[go_p[0]] += 1
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        #  a GO is complete when the masks of all its parents inside the closure have been added to it
+        propagated = {go: seeds.get(go, 0) for go in parents}
+        queue = [go for go, count in parents.items() if count == 0]
+        while queue:
+            vertex = queue.pop()
+            for go_p in self.__triplets_father_son.get(vertex, ()):
+                if go_p[0].startswith("GO_") and go_p[1] in self.__valid_edges:
+                    propagated[go_p[0]] |= propagated[vertex]
+                    parents[go_p[0]] -= 1
+                    if parents[go_p[0]] == 0:
+                        queue.append(go_p[0])
+                    #  END IF
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        #  GO left are in (or under) a cycle of valid edges: repeat on them until no mask grows
+        queue = [go for go, count in parents.items() if count > 0]
+        while queue:
+            vertex = queue.pop()
+            for go_p in self.__triplets_father_son.get(vertex, ()):
+                if go_p[0].startswith("GO_") and go_p[1] in self.__valid_edges:
+                    if propagated[go_p[0]] | propagated[vertex] != propagated[go_p[0]]:
+                        propagated[go_p[0]] |= propagated[vertex]
+                        queue.append(go_p[0])
+                    #  END IF
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        return {go: mask for go, mask in propagated.items() if mask}
+
+    #  END DEF
+
+    def inherit_to_descendants(self, own):
+        #  own: GO -> frozenset (e.g. the taxa of its constraints). Returns for each GO under them
+        #  (through any edge, as go_descendants) the union of its own set and of the sets of all the GO
+        #  it descends from, walking the graph once from the top. A GO whose union is one of the sets
+        #  reaching it shares that frozenset instead of copying it.
+        #  downward closure and number of edges reaching each GO inside it
+        parents = {go: 0 for go in own}
+        queue = list(own)
+        while queue:
+            vertex = queue.pop()
+            for go_p in self.__triplets_father_son.get(vertex, ()):
+                if go_p[0].startswith("GO_"):
+                    if go_p[0] not in parents:
+                        parents[go_p[0]] = 0
+                        queue.append(go_p[0])
+                    #  END IF
+                    parents[go_p[0]] += 1
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        #  sets reaching each GO from its parents, keyed by id to keep one copy of the shared ones
+        incoming = {go: {} for go in parents}
+        for go in own:
+            if own[go]:
+                incoming[go][id(own[go])] = own[go]
+            #  END IF
+        #  END FOR
+        inherited = {}
+        queue = [go for go, count in parents.items() if count == 0]
+        while queue:
+            vertex = queue.pop()
+            self.__inherit_union(vertex, incoming.pop(vertex), inherited)
+            for go_p in self.__triplets_father_son.get(vertex, ()):
+                if go_p[0].startswith("GO_"):
+                    incoming[go_p[0]][id(inherited[vertex])] = inherited[vertex]
+                    parents[go_p[0]] -= 1
+                    if parents[go_p[0]] == 0:
+                        queue.append(go_p[0])
+                    #  END IF
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        #  GO left are in (or under) a cycle of the graph: repeat on them until no union grows
+        queue = list(incoming)
+        while queue:
+            vertex = queue.pop()
+            size = -1
+            if vertex in inherited:
+                size = len(inherited[vertex])
+                incoming[vertex][id(inherited[vertex])] = inherited[vertex]
+            #  END IF
+            self.__inherit_union(vertex, incoming[vertex], inherited)
+            if len(inherited[vertex]) == size:
+                continue
+            #  END IF
+            for go_p in self.__triplets_father_son.get(vertex, ()):
+                if go_p[0] in incoming:
+                    incoming[go_p[0]][id(inherited[vertex])] = inherited[vertex]
+                    queue.append(go_p[0])
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        return {go: taxa for go, taxa in inherited.items() if taxa}
+
+    #  END DEF
+
+    @staticmethod
+    def __inherit_union(vertex, sets, inherited):
+        #  union of the sets reaching vertex, shared with one of them when it already is the union
+        inherited[vertex] = frozenset().union(*sets.values())
+        for taxa in sets.values():
+            if len(taxa) == len(inherited[vertex]):
+                inherited[vertex] = taxa
+                break
+            #  END IF
+        #  END FOR
+
+    #  END DEF
+
     def go_descendants_by_ontology_using_valid_edges(self, go_name):
         go_done = {}
         go_list = []
@@ -913,6 +1066,58 @@ class GoOwl:
         return taxon_constraints
     #  END DEF
 
+    def __taxon_restrictions(self, go_concept):
+        #  the restrictions read by go_taxon_constraints, stored once for all the GO. The rows of
+        #  the GO are added together, an error (as in go_taxon_constraints) stops the loading
+        rows = []
+        for parent in go_concept.is_a:
+            if isinstance(parent, Restriction):
+                if parent.property not in self.__taxon_relation_codes:
+                    label = parent.property.label.first()
+                    code = None
+                    if label is not None and label.find('taxon') >= 0:
+                        code = len(self.__taxon_relations)
+                        self.__taxon_relations.append(label)
+                        self.__taxon_relations.append('Never ' + label)
+                    #  END IF
+                    self.__taxon_relation_codes[parent.property] = code
+                #  END IF
+                code = self.__taxon_relation_codes[parent.property]
+                if code is None:
+                    continue
+                #  END IF
+                taxon = parent.value
+                if isinstance(taxon, Not):
+                    taxon = taxon.Class
+                    code += 1
+                #  END IF
+                if taxon.name not in self.__taxon_names:
+                    self.__taxon_names[taxon.name] = taxon.label.first()
+                #  END IF
+                rows.append((go_concept.name, code, taxon.name))
+            #  END IF
+        #  END FOR
+        self.__taxon_constraints.extend(rows)
+    #  END DEF
+
+    def go_taxon_constraints_table(self):
+        #  (GO, relation code, taxon id) of all the taxon restrictions of go-plus, in the order of
+        #  go_taxon_constraints; taxon_relations() gives the relation of each code
+        if 'go-plus' not in self.__owl:
+            e_print('The method go_taxon_constraints_table only works with the go-plus.')
+        return self.__taxon_constraints
+    #  END DEF
+
+    def taxon_relations(self):
+        #  relation of each code of go_taxon_constraints_table, as the 'rel' of go_taxon_constraints
+        return self.__taxon_relations
+    #  END DEF
+
+    def taxon_constraint_name(self, taxon_id):
+        #  name of a taxon (or Union taxon) of go_taxon_constraints_table
+        return self.__taxon_names.get(taxon_id)
+    #  END DEF
+
     def get_gos_by_distance(self, node, d=0):
         distance_list = []
         distance_queue = []
@@ -1215,6 +1420,87 @@ class GoOwl:
 
     #  END DEF
 
+    def cumulative_freq_corpus_ml_sparse(self, list_goa):
+        #  same values of cumulative_freq_corpus_ml, walking upward only from the GO with occurrences:
+        #  returns only the GO whose cumulated frequency is not 0
+        own = {}
+        for go, freq in list_goa.items():
+            if go in self.__global and freq != 0:
+                own[go] = freq
+            #  END IF
+        #  END FOR
+        #  upward closure of the annotated GO and number of children of each GO inside it
+        children = {go: 0 for go in own}
+        queue = list(own)
+        while queue:
+            vertex = queue.pop()
+            for go in self.__triplets_son_father_go_only[vertex]:
+                if go not in self.__global:
+                    continue
+                #  END IF
+                if go not in children:
+                    children[go] = 0
+                    queue.append(go)
+                #  END IF
+                children[go] += 1
+            #  END FOR
+        #  END WHILE
+        #  a GO is complete when all its children inside the closure have been added to it
+        #  (one addition per path, as in bfs_corpus_ml)
+        cumulative = {go: own.get(go, 0) for go in children}
+        queue = [go for go, count in children.items() if count == 0]
+        while queue:
+            vertex = queue.pop()
+            for go in self.__triplets_son_father_go_only[vertex]:
+                if go not in self.__global:
+                    continue
+                #  END IF
+                cumulative[go] += cumulative[vertex]
+                children[go] -= 1
+                if children[go] == 0:
+                    queue.append(go)
+                #  END IF
+            #  END FOR
+        #  END WHILE
+        return {go: freq for go, freq in cumulative.items() if freq != 0}
+
+    #  END DEF
+
+    def go_ancestors_paths_ml(self, go_name):
+        #  number of paths from go_name to each of its ancestors (go_name itself counts one path),
+        #  that is how many times bfs_corpus_ml adds the occurrences of go_name to each of them.
+        #  Then cumulative_freq_corpus_ml(list_goa)[go] is the sum of list_goa[g] * paths[go]
+        #  over the paths of every g in list_goa. Results are kept for the following calls
+        if go_name not in self.__global:
+            return {}
+        if go_name in self.__ancestors_paths:
+            return self.__ancestors_paths[go_name]
+
+        stack = [go_name]
+        while stack:
+            vertex = stack[-1]
+            parents = self.__triplets_son_father_go_only.get(vertex, ())
+            todo = [go for go in parents if go not in self.__ancestors_paths]
+            if todo:
+                stack.extend(todo)
+                continue
+            #  END IF
+            stack.pop()
+            if vertex in self.__ancestors_paths:
+                continue
+            #  END IF
+            paths = {vertex: 1}
+            for go in parents:
+                for ancestor, count in self.__ancestors_paths[go].items():
+                    paths[ancestor] = paths.get(ancestor, 0) + count
+                #  END FOR
+            #  END FOR
+            self.__ancestors_paths[vertex] = paths
+        #  END WHILE
+        return self.__ancestors_paths[go_name]
+
+    #  END DEF
+
     def cumulative_freq_corpus_ml_by_ontology(self, list_goa):
         #  fill cumulative
         cumulative = {}
@@ -11,16 +11,53 @@
 # Licence:     GPL
 #-------------------------------------------------------------------------------
 
+import os
 import sys
 import argparse
 import copy
+import zlib
+import tempfile
+from gafLibrary import *
+
+
+def partition_of(values, partitions):
+    # stable hash of (accession, GO, evidence) so the same annotation always lands in the same spill file
+    key = f'{values[1]}\t{values[4]}\t{values[6]}'.encode()
+    return zlib.crc32(key) % partitions
+##END DEF
+
+
+def dedup_partitions(spill_files, fout):
+    # every duplicate of an annotation is in the same spill file, so each one can be deduplicated on its own
+    for spill_file in spill_files:
+        recorded = dict()
+        with open(spill_file, 'r') as spill:
+            for line in spill:
+                values = line.split("\t")
+                recorded[(values[1],values[4],values[6])] = line
+            ## END FOR
+        ## END WITH
+        spill.close()
+        for info in recorded:
+            fout.write(recorded[info])
+        ## END FOR
+        recorded.clear()
+    ## END FOR
+##END DEF
 
 
 def main(args):
 
-    fout = open(args['gafout'], "w")
+    # the spill files (and their number) depend on -unsorted and -partitions
+    settings = {'unsorted': args['unsorted'], 'partitions': args['partitions']}
+    reader = GafReader(args['gaf'], args['checkpoint'], args['checkpoint_every'], args['resume'], settings)
+    resumed = reader.resumed_state()
     recorded = dict()
     accid = ''
+    if resumed is not None:
+        accid = resumed['accid']
+        recorded = resumed['recorded']
+    ##END IF
     unclassified = set()
     with open(args['unclass'], 'r') as inp:
         for rows in inp:
@@ -28,65 +65,105 @@ def main(args):
             unclassified.add(row[0].strip())
         #END FOR
     #END WITH
-    with open (args['gaf']) as gaf:
-        for line in gaf:
-            if line.startswith('!'):
-                continue
-            #END IF
-            values = line.split("\t")
-            value = values[12].split('|')
-            valu = value[0].split(':')
-            val = valu[1].strip()
-            #keep only protein annotations
-            if values[11] != "protein":
-                continue
-            ## END IF
-            #remove root ontology terms annotations
-            if  values[3] == 'NOT' or values[4] == 'GO:0005575' or values[4] == 'GO:0008150' or values[4] == 'GO:0003674' or values[6] == 'ND':
-                continue
-            #END IF
-            #remove entries from taxonomically unclassified organisms
-            if val in unclassified:
+    spill_files = list()
+    spill = list()
+    spill_dir = None
+    if args['unsorted']:
+        if resumed is not None:
+            spill_dir = resumed['spill_dir']
+        else:
+            tmpdir = args['tmpdir']
+            if tmpdir is None:
+                tmpdir = os.path.dirname(os.path.abspath(args['gafout']))
+            ##END IF
+            spill_dir = tempfile.mkdtemp(prefix='purge_spill_', dir=tmpdir)
+        ##END IF
+        for i in range(args['partitions']):
+            spill_files.append(os.path.join(spill_dir, f'part_{i}.gaf'))
+            spill.append(reader.open_output(spill_files[i], i))
+        ##END FOR
+        fout = open(args['gafout'], "w")
+        outputs = spill
+    else:
+        fout = reader.open_output(args['gafout'])
+        outputs = [fout]
+    ##END IF
+    state = lambda: {'accid': accid, 'recorded': recorded, 'spill_dir': spill_dir}
+    for line in reader.lines(state, outputs):
+        if line.startswith('!'):
+            continue
+        #END IF
+        values = line.split("\t")
+        value = values[12].split('|')
+        valu = value[0].split(':')
+        val = valu[1].strip()
+        #keep only protein annotations
+        if values[11] != "protein":
+            continue
+        ## END IF
+        #remove root ontology terms annotations
+        if  values[3] == 'NOT' or values[4] == 'GO:0005575' or values[4] == 'GO:0008150' or values[4] == 'GO:0003674' or values[6] == 'ND':
+            continue
+        #END IF
+        #remove entries from taxonomically unclassified organisms
+        if val in unclassified:
+            continue
+        #END IF
+        #remove entries from InterPro database
+        if (args['no_interpro']):
+            if (values[14] == 'InterPro'):
                 continue
-            #END IF
-            #remove entries from InterPro database
-            if (args['no_interpro']):
-                if (values[14] == 'InterPro'):
-                    continue
-                ##END IF
             ##END IF
-            #remove entries from PANTHER database
-            if (args['no_panther']):
-                different_from = values[7].split('|')
-                status_panther = True
-                for i in different_from:
-                    if 'PANTHER' not in i and 'Pfam' not in i:
-                        status_panther = False
-                if status_panther:
-                    continue
-                ##END IF
+        ##END IF
+        #remove entries from PANTHER database
+        if (args['no_panther']):
+            different_from = values[7].split('|')
+            status_panther = True
+            for i in different_from:
+                if 'PANTHER' not in i and 'Pfam' not in i:
+                    status_panther = False
+            if status_panther:
+                continue
             ##END IF
-            if values[1] != accid:
-                if bool(recorded):
-                    for info in recorded:
-                        fout.write(recorded[info])
-                    ## END FOR
-                    recorded.clear()
-                ## END IF
-                accid = values[1]
-                recorded[(values[4],values[6])] = line
-            else:
-                recorded[(values[4],values[6])] = line
+        ##END IF
+        #input in any order: spill to the hash partitions and deduplicate them at the end
+        if args['unsorted']:
+            spill[partition_of(values, args['partitions'])].write(line)
+            continue
+        ##END IF
+        if values[1] != accid:
+            if bool(recorded):
+                for info in recorded:
+                    fout.write(recorded[info])
+                ## END FOR
+                recorded.clear()
             ## END IF
-        ## END FOR
-    ## END WITH
+            accid = values[1]
+            recorded[(values[4],values[6])] = line
+        else:
+            recorded[(values[4],values[6])] = line
+        ## END IF
+    ## END FOR
     if bool(recorded):
         for info in recorded:
             fout.write(recorded[info])
         ## END FOR
     ## END IF
-    gaf.close()
+    if args['unsorted']:
+        for part in spill:
+            part.close()
+        ## END FOR
+        dedup_partitions(spill_files, fout)
+    ## END IF
     fout.close()
+    reader.done()
+    # the spill files are removed only now: until the checkpoint is gone a resume reopens them
+    if args['unsorted']:
+        for spill_file in spill_files:
+            os.remove(spill_file)
+        ## END FOR
+        os.rmdir(spill_dir)
+    ## END IF
 ##END DEF
 
 
@@ -98,6 +175,12 @@ if __name__ == "__main__":
     parser.add_argument('-gafout', metavar='OUTPUT_FILE',  help='purged GOA file output', required=True)
     parser.add_argument('-no_interpro', help='discard annotations from InterPro origin (OPTIONAL)', action='store_true', required=False)
     parser.add_argument('-no_panther', help='discard annotations from PANTHER origin (OPTIONAL)', action='store_true', required=False)
+    parser.add_argument('-unsorted', help='deduplicate annotations of a GAF file not grouped by accession (e.g. merged or concatenated GAF files) using hash partitioned spill files (OPTIONAL)', action='store_true', required=False)
+    parser.add_argument('-partitions', metavar='INTEGER', type=int, default=128, help='number of spill files used by -unsorted, each one must fit in memory (OPTIONAL, default: 128)', required=False)
+    parser.add_argument('-checkpoint', metavar='OUTPUT_FILE', help='file where the reading of -gaf is periodically checkpointed (OPTIONAL)', required=False)
+    parser.add_argument('-checkpoint_every', metavar='INTEGER', type=int, default=10000000, help='number of GAF lines between two checkpoints (OPTIONAL, default: 10000000)', required=False)
+    parser.add_argument('-resume', help='continue from the last checkpoint written in -checkpoint (OPTIONAL)', action='store_true', required=False)
+    parser.add_argument('-tmpdir', metavar='DIRECTORY', help='directory where the spill files of -unsorted are written (OPTIONAL, default: folder of -gafout)', required=False)
     args = vars(parser.parse_args())
     main(args)
 #END MAIN
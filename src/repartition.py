@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+#-------------------------------------------------------------------------------
+# Name:        repartition.py
+# Purpose:     what-if partitioning of the taxonomy: for one or more
+#              taxonConstraintsDef.txt files produces the same outputs of
+#              clusterTaxon.py, speciesFreqCumul.py, createNeverIN.py and
+#              wrapperTaxonConstraints.py, loading GO, taxonomy and species
+#              GO usage only once and reusing the results of the clusters
+#              whose species did not change
+#
+# Author:      Stefano - Emilio - Ermanno
+#
+# Created:     19/10/2026
+# Copyright:   (c) Stefano 2019
+# Licence:     GPL
+#-------------------------------------------------------------------------------
+
+
+import sys, argparse, os
+from owlready2 import *
+from owlLibrary2 import *
+from taxonLibrary3 import *
+from goaMatrixLibrary import *
+from constraintStoreLibrary import *
+
+
+def read_partition(constraints_file):
+    # reference node -> cluster name (as clusterTaxon.py) and
+    # cluster name -> {reference node: taxon name} (as wrapperTaxonConstraints.py)
+    son_parent = {}
+    union = dict()
+    with open(constraints_file, 'r') as constraints:
+        for line in constraints:
+            if line.startswith('#'):
+                continue
+            #END IF
+            values = line.strip().split("\t")
+            id_taxon    = values[0].strip()
+            taxon_name  = values[1].strip()
+            parent_name = values[4].strip()
+            son_parent[id_taxon] = taxon_name
+            union.setdefault(parent_name, dict())[id_taxon] = taxon_name
+        #END FOR
+    #END WITH
+    constraints.close()
+
+    return son_parent, union
+#END DEF
+
+
+def read_cutoff_gos(goa_freq, cutoff):
+    # GO that can be used to define constraints (as createNeverIN.py)
+    GO = set()
+    with open(goa_freq, "r") as goafreq:
+        for line in goafreq:
+            line = line.strip()
+            if line.startswith("#"):
+                continue
+            ##END IF
+            values = line.split("\t")
+            if int(values[6]) >= cutoff:
+                GO.add(values[0])
+            ##END IF
+        ##END FOR
+    ##END WITH
+    goafreq.close()
+
+    return GO
+#END DEF
+
+
+class Repartition:
+    def __init__(self, goowl, Taxa, speciesGO, cutoff_gos, sparse=False):
+        self.__goowl = goowl
+        self.__sparse = sparse
+        self.__taxa = Taxa
+        self.__species = speciesGO
+        # GO written by speciesFreqCumul.py for each cluster, and the ones among them createNeverIN.py looks at
+        self.__listing = sorted(goowl.listing())
+        self.__candidates = [go for go in self.__listing if go in cutoff_gos]
+        self.__details = {}
+        self.__descendants = {}
+        # frozenset of the species (rows of the matrix) of a cluster -> its results
+        self.__clusters = {}
+    #END DEF
+
+
+    def __go_details(self, go):
+        if go not in self.__details:
+            details = self.__goowl.go_single_details(go)
+            self.__details[go] = (details["namespace"], details["name"])
+        #END IF
+
+        return self.__details[go]
+    #END DEF
+
+
+    def __go_descendants(self, go):
+        if go not in self.__descendants:
+            self.__descendants[go] = list(self.__goowl.go_descendants_using_valid_edges(go).keys())
+        #END IF
+
+        return self.__descendants[go]
+    #END DEF
+
+
+    def __cluster(self, go_list):
+        # cumulated frequencies (speciesFreqCumul.py) and NEVER_IN GO (createNeverIN.py) of one cluster
+        GO = {}
+        GOP = {}
+        for go, details in go_list.items():
+            if go.startswith('GO'):
+                GO[go] = details['freq']
+                GOP[go] = details['database']
+            #END IF
+        #END FOR
+        corpusCumul = {}
+        for go, freq in GO.items():
+            for ancestor, paths in self.__goowl.go_ancestors_paths_ml(go).items():
+                corpusCumul[ancestor] = corpusCumul.get(ancestor, 0) + freq * paths
+            #END FOR
+        #END FOR
+        never_in = set()
+        for go in self.__candidates:
+            cumul = corpusCumul.get(go, 0)
+            if cumul == 0 or (cumul == 1 and GOP.get(go, 'N') == 'P'):
+                never_in.add(go)
+                never_in.update(self.__go_descendants(go))
+            #END IF
+        #END FOR
+
+        return GO, GOP, corpusCumul, sorted(never_in)
+    #END DEF
+
+
+    def run(self, constraints_file, out_files):
+        # out_files: cluster GO usage, cumulated frequencies and NEVER_IN output files, constraint store
+        # (as wrapperTaxonConstraints.py -db) and optionally the reformatted NEVER_IN file (-out)
+        son_parent, union = read_partition(constraints_file)
+        ## reference node clustering each species, as clusterTaxon.py
+        taxa = self.__species.get_taxa()
+        groups = []
+        members = {}
+        for row, father in enumerate(self.__taxa.get_nearest_references(taxa, son_parent.keys())):
+            if father is None:
+                print(f"WARNING: {taxa[row]} is not under any taxon of {constraints_file}, not clustered")
+                groups.append(None)
+            else:
+                groups.append(son_parent[father])
+                members.setdefault(son_parent[father], []).append(row)
+            ## END IF
+        ## END FOR
+        clusterGO = self.__species.group_by(groups)
+        clusterGO.write_usage(out_files[0])
+
+        reused = 0
+        results = []
+        for taxon, go_list in clusterGO.iter_rows():
+            key = frozenset(members[taxon])
+            if key in self.__clusters:
+                reused += 1
+            else:
+                self.__clusters[key] = self.__cluster(go_list)
+            #END IF
+            results.append((taxon, self.__clusters[key]))
+        #END FOR
+        # speciesFreqCumul.py drops the last cluster when it has no GO
+        if results and not results[-1][1][0]:
+            results.pop()
+        #END IF
+
+        with open(out_files[1], 'w') as out:
+            for taxon, (GO, GOP, corpusCumul, never_in) in results:
+                out.write(f'>{taxon}\n')
+                gos = self.__listing
+                if self.__sparse:
+                    # as speciesFreqCumul.py -sparse, only the GO with cumulated frequency
+                    gos = sorted(go for go in corpusCumul if go in self.__goowl.listing())
+                #END IF
+                for go in gos:
+                    namespace, name = self.__go_details(go)
+                    out.write(f'{go}\t{corpusCumul.get(go, 0)}\t{GO.get(go, 0)}\t{namespace}\t{name}\t{GOP.get(go, "N")}\n')
+                ##END FOR
+            ##END FOR
+        ##END WITH
+        out.close()
+        with open(out_files[2], 'w') as out:
+            for taxon, (GO, GOP, corpusCumul, never_in) in results:
+                out.write(f'>{taxon}\n')
+                for go in never_in:
+                    namespace, name = self.__go_details(go)
+                    out.write(f'{go}\tnever_in\t{name}\t{namespace}\n')
+                ##END FOR
+            ##END FOR
+        ##END WITH
+        out.close()
+        store = ConstraintStore(out_files[3], create=True)
+        for taxon, (GO, GOP, corpusCumul, never_in) in results:
+            gos = []
+            for go in never_in:
+                namespace, name = self.__go_details(go)
+                gos.append((go, str(name), str(namespace)))
+            ##END FOR
+            store.add_never_in(taxon, gos)
+        ##END FOR
+        for parent_name in union:
+            for idTaxon in union[parent_name]:
+                store.add_taxon(idTaxon, union[parent_name][idTaxon], parent_name)
+            ##END FOR
+        ##END FOR
+        if len(out_files) > 4:
+            with open(out_files[4], 'w') as out:
+                out.writelines(store.iter_lines())
+            ##END WITH
+            out.close()
+        ##END IF
+        store.close()
+
+        return len(results), reused
+    #END DEF
+
+#END CLASS
+
+
+def main(args):
+
+    if args['matrix'] is not None:
+        speciesGO = GOAMatrix(args['matrix'])
+    elif args['species'] is not None:
+        speciesGO = read_usage(args['species'])
+    else:
+        print("ERROR: one of -species or -matrix is required")
+        sys.exit(1)
+    #END IF
+    Taxa = Taxon(args['taxa'], args['merge'], args['names'])
+    goowl = GoOwl(args['owl'], "http://purl.obolibrary.org/obo/")
+    engine = Repartition(goowl, Taxa, speciesGO, read_cutoff_gos(args['goa_freq'], args['cutoff']), args['sparse'])
+
+    partitions = list(args['constraints'])
+    # with a single partition the outputs have the names used by generate_intermediate.sh,
+    # otherwise the name of the partition file is appended to them
+    tagged = len(partitions) > 1 or args['interactive']
+    if args['interactive']:
+        print('Partition files to evaluate, one per line (end with Ctrl-D):')
+    #END IF
+    while partitions or args['interactive']:
+        if partitions:
+            constraints_file = partitions.pop(0)
+        else:
+            line = sys.stdin.readline()
+            if not line:
+                break
+            #END IF
+            constraints_file = line.strip()
+            if not constraints_file:
+                continue
+            #END IF
+            if not os.path.exists(constraints_file):
+                print(f'WARNING: {constraints_file} not found')
+                continue
+            #END IF
+        #END IF
+        tag = ''
+        if tagged:
+            tag = '_' + os.path.splitext(os.path.basename(constraints_file))[0]
+        #END IF
+        out_files = [os.path.join(args['out_dir'], f'{name}{tag}.txt') for name in
+                     ('cluster_speciesGOusage', 'freqCumul_cluster_speciesGOusage', 'freqCumul_cluster_speciesGOusage_NEVER_IN')]
+        out_files.append(os.path.join(args['out_dir'], f'freqCumul_cluster_speciesGOusage_NEVER_IN{tag}.db'))
+        if args['reformat']:
+            out_files.append(os.path.join(args['out_dir'], f'freqCumul_cluster_speciesGOusage_NEVER_IN_reformat{tag}.txt'))
+        #END IF
+        clusters, reused = engine.run(constraints_file, out_files)
+        print(f'{constraints_file}: {clusters} clusters, {reused} unchanged from previous partitions')
+    #END WHILE
+#END MAIN
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Cluster species, cumulate GO frequencies and create the never_in constraints for one or more taxonConstraintsDef.txt files, with the same outputs of clusterTaxon.py, speciesFreqCumul.py, createNeverIN.py and wrapperTaxonConstraints.py')
+    parser.add_argument('-constraints', metavar='INPUT_FILE', nargs='+', help='taxonConstraintsDef.txt files, each one a partition of the taxonomy to evaluate', required=True)
+    parser.add_argument('-interactive', help='after the -constraints files keep GO, taxonomy and clusters loaded and read further partition files from standard input (OPTIONAL)', action='store_true', required=False)
+    parser.add_argument('-reformat', help='write also the reformatted NEVER_IN text file of wrapperTaxonConstraints.py -out (OPTIONAL)', action='store_true', required=False)
+    parser.add_argument('-sparse', help='leave out of the cumulated frequencies the GO with cumulated freq 0, as speciesFreqCumul.py -sparse (OPTIONAL)', action='store_true', required=False)
+    parser.add_argument('-species', metavar='INPUT_FILE',  help='file output of speciesToGO.py where each species and its GOs are reported in mulfasta format (required if -matrix is not given)', required=False)
+    parser.add_argument('-matrix', metavar='INPUT_FILE',  help='binary matrix written by speciesToGO.py -matrix, used instead of -species', required=False)
+    parser.add_argument('-owl', metavar='INPUT_FILE', help='go-plus.owl file', required=True)
+    parser.add_argument('-goa_freq', metavar='INPUT_FILE',  help='GOAfreq file generated by GOAfreq.py', required=True)
+    parser.add_argument('-cutoff', metavar='INTEGER', type=int, help='cutoff of GO occurrence to be considered as potential constraint (integer)', required=True)
+    parser.add_argument('-merge', metavar='INPUT_FILE',  help='merged.dmp file where some taxa have been substitued with others', required=True)
+    parser.add_argument('-taxa', metavar='INPUT_FILE',  help='nodes.dmp file containining taxa from Taxonomy', required=True)
+    parser.add_argument('-names', metavar='INPUT_FILE',  help='names.dmp file containining correspondence of names and id numbers from Taxonomy', required=True)
+    parser.add_argument('-out_dir', metavar='OUTPUT_FOLDER',  help='folder of the output files (.txt, and .db constraint store), suffixed with the name of the partition file when more than one partition is evaluated', required=True)
+    args = vars(parser.parse_args())
+    main(args)
+#END MAIN
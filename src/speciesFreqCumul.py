@@ -13,70 +13,102 @@
 #-------------------------------------------------------------------------------
 
 
-import sys, argparse, copy
+import sys, argparse, copy, multiprocessing
 from owlready2 import *
 from owlLibrary2 import *
 
 
-def main(args):
+# GO graph, GO details and options of the worker processes, inherited from the main process when they are forked
+WORKER = {}
 
-    goowl = GoOwl(args['owl'],"http://purl.obolibrary.org/obo/")
+
+def read_clusters(freq_file):
+    # yield taxon, {GO: freq} and {GO: database flag} of each subdivision of clusterTaxon.py output
     status = False
     taxon = ''
     GO = {}
     GOP = {}
-    with open(args['out_freq'], "w") as out:
-        with open(args['freq'], "r") as cluster:
-            for line in cluster:
-                line = line.strip()
-                if line.startswith('>'):
-                    if taxon:
-                        corpusCumul = goowl.cumulative_freq_corpus_ml(GO)
-                        out.write(f'>{taxon}\n')
-                        for go in sorted(corpusCumul):
-                            freq = 0
-                            pant = 'N'
-                            if go in GO:
-                                freq = GO[go]
-                            if go in GOP:
-                                pant = GOP[go]
-                            #END IF
-                            details = goowl.go_single_details(go)
-                            out.write(f'{go}\t{corpusCumul[go]}\t{freq}\t{details["namespace"]}\t{details["name"]}\t{pant}\n')
-                        ##END FOR
-                        status = False
-                        GO.clear()
-                        GOP.clear()
-                        corpusCumul.clear()
-                    ## END IF
-                    taxon = line[1:len(line)]
-                else:
-                    ### take GOs and freq
-                    status = True
-                    GOval = line.split("\t")
-                    GO[GOval[0].strip()] = int(GOval[1].strip())
-                    GOP[GOval[0].strip()] = GOval[4].strip()
+    with open(freq_file, "r") as cluster:
+        for line in cluster:
+            line = line.strip()
+            if line.startswith('>'):
+                if taxon:
+                    yield taxon, GO, GOP
+                    status = False
+                    GO = {}
+                    GOP = {}
                 ## END IF
-            ## END FOR
-        ## END WITH
-        cluster.close()
-        if status:
-            corpusCumul = goowl.cumulative_freq_corpus_ml(GO)
-            out.write(f'>{taxon}\n')
-            for go in sorted(corpusCumul):
-                freq = 0
-                pant = 'N'
-                if go in GO:
-                    freq = GO[go]
-                if go in GOP:
-                    pant = GOP[go]
-                #END IF
-                details = goowl.go_single_details(go)
-                out.write(f'{go}\t{corpusCumul[go]}\t{freq}\t{details["namespace"]}\t{details["name"]}\t{pant}\n')
+                taxon = line[1:len(line)]
+            else:
+                ### take GOs and freq
+                status = True
+                GOval = line.split("\t")
+                GO[GOval[0].strip()] = int(GOval[1].strip())
+                GOP[GOval[0].strip()] = GOval[4].strip()
+            ## END IF
+        ## END FOR
+    ## END WITH
+    cluster.close()
+    if status:
+        yield taxon, GO, GOP
+    ##END IF
+##END DEF
+
+
+def cluster_text(goowl, taxon, GO, GOP, sparse=False, go_details=None):
+    # cumulated frequencies of one cluster: every GO of the ontology, or with sparse only the
+    # GO whose cumulated frequency is not 0 (createNeverIN.py reads the missing ones as 0).
+    # go_details, if given, are the details of the GO of the ontology
+    if sparse:
+        corpusCumul = goowl.cumulative_freq_corpus_ml_sparse(GO)
+    else:
+        corpusCumul = goowl.cumulative_freq_corpus_ml(GO)
+    #END IF
+    lines = [f'>{taxon}\n']
+    for go in sorted(corpusCumul):
+        freq = 0
+        pant = 'N'
+        if go in GO:
+            freq = GO[go]
+        if go in GOP:
+            pant = GOP[go]
+        #END IF
+        if go_details is not None:
+            details = go_details[go]
+        else:
+            details = goowl.go_single_details(go)
+        #END IF
+        lines.append(f'{go}\t{corpusCumul[go]}\t{freq}\t{details["namespace"]}\t{details["name"]}\t{pant}\n')
+    ##END FOR
+    return ''.join(lines)
+##END DEF
+
+
+def worker_cluster(cluster):
+    taxon, GO, GOP = cluster
+    return cluster_text(WORKER['goowl'], taxon, GO, GOP, WORKER['sparse'], WORKER['details'])
+##END DEF
+
+
+def main(args):
+
+    goowl = GoOwl(args['owl'],"http://purl.obolibrary.org/obo/")
+    with open(args['out_freq'], "w") as out:
+        if args['workers'] > 1:
+            ## the workers share the loaded GO graph copy-on-write. The details are read here once for all,
+            ## the workers do not touch the ontology database opened by this process
+            WORKER['goowl'] = goowl
+            WORKER['sparse'] = args['sparse']
+            WORKER['details'] = {go: goowl.go_single_details(go) for go in goowl.listing()}
+            with multiprocessing.get_context('fork').Pool(args['workers']) as pool:
+                for text in pool.imap(worker_cluster, read_clusters(args['freq'])):
+                    out.write(text)
+                ##END FOR
+            ##END WITH
+        else:
+            for taxon, GO, GOP in read_clusters(args['freq']):
+                out.write(cluster_text(goowl, taxon, GO, GOP, args['sparse']))
             ##END FOR
-            status = False
-            GOP.clear()
-            GO.clear()
         ##END IF
     ##END WITH
     out.close()
@@ -87,6 +119,8 @@ if __name__ == '__main__':
     parser.add_argument('-owl', metavar='INPUT_FILE',  help='go-plus.owl file', required=True)
     parser.add_argument('-freq', metavar='INPUT_FILE',  help='file containing GO freq generated by the script clusterTaxon.py', required=True)
     parser.add_argument('-out_freq', metavar='OUTPUT_FILE',  help='output file containining cumulated freq for each taxa subdivision', required=True)
+    parser.add_argument('-workers', metavar='INTEGER', type=int, default=1, help='number of processes computing the subdivisions in parallel (OPTIONAL, default 1)', required=False)
+    parser.add_argument('-sparse', help='propagate only the GO found in each subdivision and leave out the GO with cumulated freq 0 (OPTIONAL)', action='store_true', required=False)
     args = vars(parser.parse_args())
     main(args)
 #END MAIN
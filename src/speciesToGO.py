@@ -12,79 +12,137 @@
 # Licence:     GPL
 #-------------------------------------------------------------------------------
 
-import sys, argparse, copy, re
+import sys, os, argparse, copy, re
 from owlready2 import *
 from taxonLibrary3 import *
+from gafLibrary import *
+from goaMatrixLibrary import *
+
+
+SAMPLE_ACCESSIONS = 5
+
+
+def read_delnodes(delnodes_file):
+    deleted = set()
+    with open(delnodes_file,'r') as fin:
+        for line in fin:
+            deleted.add(line.split('|')[0].strip())
+        #END FOR
+    #END WITH
+    fin.close()
+
+    return deleted
+#END DEF
+
+
+def missing_status(taxon, merged, deleted):
+    # follow the merges of a taxon not found in nodes.dmp to tell why it is missing
+    seen = set()
+    while taxon in merged and taxon not in seen:
+        seen.add(taxon)
+        taxon = merged[taxon]
+    #END WHILE
+    if taxon in deleted:
+        return 'deleted', taxon
+    #END IF
+    if seen:
+        return 'merged_into_missing', taxon
+    #END IF
+
+    return 'unknown', taxon
+#END DEF
+
+
+def write_missing(missing, merged, deleted, out):
+    out.write("#taxon\tstatus\tlast_taxon\tannotations\tsample_accessions\n")
+    for taxon in sorted(missing, key=lambda t: (-missing[t]['count'], t)):
+        status, last = missing_status(taxon, merged, deleted)
+        out.write(f"{taxon}\t{status}\t{last}\t{missing[taxon]['count']}\t{','.join(missing[taxon]['accessions'])}\n")
+    #END FOR
+#END DEF
 
 
 def main(args):
 
-    listTotalOfSpecies = {}
+    listTotalOfSpecies = GOAMatrix()
+    # taxon not found in nodes.dmp nor in merged.dmp -> number of annotations and some of their accessions
+    missing = {}
     Taxa  = Taxon(args['taxa'],args['merge'],args['names'])
-    ancestors = Taxa.ancestors_full_list()
-    merged = Taxa.merging()
+    deleted = set()
+    if args['delnodes'] is not None:
+        deleted = read_delnodes(args['delnodes'])
+    #END IF
     #parse purged .gaf file
-    with open(args['gaf'],'r') as gaf:
-        for line in gaf:
-            line = line.strip()
-            if line.startswith("!"):
-                continue
-            values = line.split("\t")
-            go = values[4].replace(":","_")
-            evCode = values[6]
-            namespace = values[8]
-            DB = values[7]
-            if ('PANTHER' in DB) or ('Pfam' in DB) or ('InterPro' in DB):
-                DB = 'P'
-            else:
-                DB = 'N'
-            taxonTmp = re.search('[0-9]+',str(values[12]))
+    reader = GafReader(args['gaf'], args['checkpoint'], args['checkpoint_every'], args['resume'])
+    # at each checkpoint the species GO read since the previous one are spilled to a new delta file
+    # and the checkpoint only lists the delta files, so its size does not grow with the matrix
+    deltas = []
+    if reader.resumed_state() is not None:
+        deltas, missing = reader.resumed_state()
+    #END IF
+
+    def spill():
+        nonlocal listTotalOfSpecies
+        deltas.append(f"{args['checkpoint']}.delta{len(deltas)}")
+        listTotalOfSpecies.write(deltas[-1])
+        listTotalOfSpecies = GOAMatrix()
+
+        return list(deltas), missing
+    #END DEF
+
+    for line in reader.lines(spill):
+        line = line.strip()
+        if line.startswith("!"):
+            continue
+        values = line.split("\t")
+        go = values[4].replace(":","_")
+        evCode = values[6]
+        namespace = values[8]
+        DB = values[7]
+        if ('PANTHER' in DB) or ('Pfam' in DB) or ('InterPro' in DB):
+            DB = 'P'
+        else:
+            DB = 'N'
+        taxonTmp = re.search('[0-9]+',str(values[12]))
+        taxon = taxonTmp.group(0)
+        taxon = Taxa.resolve(taxon)
+        if taxon is None:
             taxon = taxonTmp.group(0)
-            if taxon not in ancestors:
-                if taxon in merged:
-                    taxon = merged[taxon]
-                #END IF
-                else:
-                    print("ERROR: missing taxon", taxon, "for protein:", values[1])
-                    continue
+            if taxon not in missing:
+                missing[taxon] = {'count': 0, 'accessions': []}
             #END IF
-            if taxon not in listTotalOfSpecies:
-                listTotalOfSpecies.setdefault(taxon,dict())
-                tmp = str()
-                for parent in ancestors[taxon]:
-                    tmp += parent + ','
-                tmp2 = tmp[:-1]
-                listTotalOfSpecies[taxon]['ancestors'] = tmp2
+            missing[taxon]['count'] += 1
+            if len(missing[taxon]['accessions']) < SAMPLE_ACCESSIONS and values[1] not in missing[taxon]['accessions']:
+                missing[taxon]['accessions'].append(values[1])
             #END IF
-            if go not in listTotalOfSpecies[taxon]:
-                listTotalOfSpecies[taxon].setdefault(go,dict())
-                listTotalOfSpecies[taxon][go] = {'counter': 1,
-                                                 'evidence': evCode,
-                                                 'namespace': namespace,
-                                                 'database' : DB
-                                                }
-            else:
-                if evCode != 'IEA':
-                    listTotalOfSpecies[taxon][go]['evidence'] = evCode
-                if DB != 'P':
-                    listTotalOfSpecies[taxon][go]['database'] = DB
-                listTotalOfSpecies[taxon][go]['counter'] += 1
-            #END IF
-        #END FOR
-    #END WITH
-    gaf.close()
-    with open(args['out'],'w') as out:
-        for taxonIter,values in listTotalOfSpecies.items():
-            out.write(f'>{taxonIter}\n')
-            for goIter in sorted(values):
-                details = values[goIter]
-                if goIter.startswith('GO'):
-                    out.write(f'{goIter}\t{details["counter"]}\t{details["evidence"]}\t{details["namespace"]}\t{details["database"]}\n')
-                #END IF
-            #END FOR
+            continue
+        #END IF
+        listTotalOfSpecies.add(taxon, go, evCode, namespace, DB)
+    #END FOR
+    if deltas:
+        lastDelta = listTotalOfSpecies
+        listTotalOfSpecies = GOAMatrix()
+        for delta in deltas:
+            listTotalOfSpecies.merge(GOAMatrix(delta))
         #END FOR
-    #END WITH
-    out.close()
+        listTotalOfSpecies.merge(lastDelta)
+    #END IF
+    listTotalOfSpecies.write_usage(args['out'])
+    if args['matrix'] is not None:
+        listTotalOfSpecies.write(args['matrix'])
+    #END IF
+    if args['missing'] is not None:
+        with open(args['missing'],'w') as out:
+            write_missing(missing, Taxa.merging(), deleted, out)
+        #END WITH
+        out.close()
+    else:
+        write_missing(missing, Taxa.merging(), deleted, sys.stdout)
+    #END IF
+    reader.done()
+    for delta in deltas:
+        os.remove(delta)
+    #END FOR
 #END MAIN
 
 
@@ -97,6 +155,12 @@ if __name__ == "__main__":
     parser.add_argument('-taxa', metavar='INPUT_FILE',  help='nodes.dmp file containining taxa from Taxonomy', required=True)
     parser.add_argument('-names', metavar='INPUT_FILE',  help='names.dmp file containining correspondence of names and id numbers from Taxonomy', required=True)
     parser.add_argument('-out', metavar='OUTPUT_FILE',  help='txt file containing output', required=True)
+    parser.add_argument('-matrix', metavar='OUTPUT_FILE',  help='binary sparse species x GO matrix with the same content of -out, readable by clusterTaxon.py (OPTIONAL)', required=False)
+    parser.add_argument('-missing', metavar='OUTPUT_FILE',  help='tab separated report of the GAF taxa found neither in nodes.dmp nor in merged.dmp, with their number of annotations and some sample accessions (OPTIONAL, default: standard output)', required=False)
+    parser.add_argument('-delnodes', metavar='INPUT_FILE',  help='delnodes.dmp file of Taxonomy, used to mark the missing taxa that have been deleted (OPTIONAL)', required=False)
+    parser.add_argument('-checkpoint', metavar='OUTPUT_FILE', help='file where the reading of -gaf is periodically checkpointed (OPTIONAL)', required=False)
+    parser.add_argument('-checkpoint_every', metavar='INTEGER', type=int, default=10000000, help='number of GAF lines between two checkpoints; each checkpoint writes the species GO read since the previous one to a -checkpoint.delta<N> file, removed at the end (OPTIONAL, default: 10000000)', required=False)
+    parser.add_argument('-resume', help='continue from the last checkpoint written in -checkpoint (OPTIONAL)', action='store_true', required=False)
     args = vars(parser.parse_args())
     main(args)
 #END MAIN
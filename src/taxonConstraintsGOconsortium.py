@@ -17,6 +17,34 @@ from owlLibrary2 import *
 from taxonLibrary3 import *
 
 
+def split_union(Taxa, taxonId, taxonName):
+    ## (taxon id, taxon name, constraint taxon) of a constraint taxon: the taxon itself,
+    ## or each member of a Union taxon
+    listTaxa = set()
+    if 'NCBITaxon_Union_' in taxonId:
+        listOfNames = taxonName.split(' or ')
+        for taxName in listOfNames:
+            listOfIds = Taxa.get_exact_ids(taxName.strip())
+            if listOfIds is not None:
+                for i in listOfIds:
+                    if i == '629395':
+                        continue
+                    ##END IF
+                    listTaxa.add((i,taxName,taxonId))
+                ##END FOR
+            else:
+                print(taxName.strip()," NOT FOUND")
+                sys.exit()
+            ##END IF
+        ##END FOR
+    else:
+        listTaxa.add((taxonId.split('_')[1].strip(),taxonName,taxonId))
+    ##END IF
+
+    return listTaxa
+#END DEF
+
+
 def main(args):
 
     ##    Union Taxa currently used in GO taxon constraints
@@ -29,164 +57,66 @@ def main(args):
     ##    NCBITaxon_Union_0000031 Stramenopiles or Cryptophyta
 
     Taxa  = Taxon(args['taxa'],args['merge'],args['names'])
-    fullList = Taxa.get_names_ids_map()
-    ancestors = Taxa.ancestors_full_list()
 
     with open(args['out_constraints'],'w') as out:
 
-        goDict = dict()
+        ## taxa of the constraints of each GO, then inherited by all its descendants in one
+        ## top-down pass over the GO graph (instead of writing them in each descendant of each GO)
+        relations = {'IN': 'only in taxon', 'NEVER': 'never in taxon'}
+        ownTaxa = {'IN': dict(), 'NEVER': dict()}
+        taxonNames = dict()
 
         goowl = GoOwl(args['owl'],"http://purl.obolibrary.org/obo/")
-        totalGO = goowl.listing()
-        for goParent in totalGO:
-            constraints = goowl.go_taxon_constraints(goParent)
-            #if len(constraints) > 0:
-                #print(goParent)
-            if bool(constraints):
-                if goParent not in goDict:
-                    goDict[goParent] = dict()
+        ## taxon restrictions of all the GO, collected while loading go-plus
+        relationOf = [relation.replace('_',' ').lower() for relation in goowl.taxon_relations()]
+        for goParent, code, taxonId in goowl.go_taxon_constraints_table():
+            for key in relations:
+                if relationOf[code] == relations[key]:
+                    ownTaxa[key].setdefault(goParent, set()).add(taxonId)
+                    taxonNames[taxonId] = goowl.taxon_constraint_name(taxonId)
                 ##END IF
-                sons = goowl.go_descendants(goParent)
-                details = goowl.go_single_details(goParent)
-                for index in constraints:
-                    relation = constraints[index]["rel"].replace('_',' ').lower()
-                    if relation == 'in taxon':
-                        continue
-                    if relation == 'never in taxon':
-                        if 'NEVER' not in goDict[goParent]:
-                            goDict[goParent]['NEVER'] = dict()
-                        goDict[goParent]['NEVER'][constraints[index]["taxonId"]] = (constraints[index]["taxonId"],constraints[index]["taxonName"], goParent + "\t" + details["name"] + "\t" + details["namespace"] + "\tPLACEHOLDERID\tPLACEHOLDERNAME\t" + relation)
-                    elif relation == 'only in taxon':
-                        #### EVEN FOR IN do exactly what you do for NEVER than only one for that particular GO will be kept and is that with lower taxon
-                        #### Union must be kept as is but when split if there is an ONLY IN with a species/class lower than one of the members of Union this will
-                        #### replace it IMPORTANT .... taxa in Union are not in relationship father -> son so only in can survive for more than one.
-                        if 'IN' not in goDict[goParent]:
-                            goDict[goParent]['IN'] = dict()
-                        goDict[goParent]['IN'][constraints[index]["taxonId"]] = (constraints[index]["taxonId"],constraints[index]["taxonName"], goParent + "\t" + details["name"] + "\t" + details["namespace"] + "\tPLACEHOLDERID\tPLACEHOLDERNAME\t" + relation)
-                    if bool(sons):
-                        for son in sons:
-                            if son not in goDict:
-                                goDict[son] = dict()
-                            if relation == 'never in taxon':
-                                if 'NEVER' not in goDict[son]:
-                                    goDict[son]['NEVER'] = dict()
-                                goDict[son]['NEVER'][constraints[index]["taxonId"]] = (constraints[index]["taxonId"],constraints[index]["taxonName"], son + "\t" + sons[son]["name"] + "\t" + sons[son]["namespace"] + "\tPLACEHOLDERID\tPLACEHOLDERNAME\t" + relation)
-                            elif relation == 'only in taxon':
-                                if 'IN' not in goDict[son]:
-                                    goDict[son]['IN'] = dict()
-                                goDict[son]['IN'][constraints[index]["taxonId"]] = (constraints[index]["taxonId"],constraints[index]["taxonName"], son + "\t" + sons[son]["name"] + "\t" + sons[son]["namespace"] + "\tPLACEHOLDERID\tPLACEHOLDERNAME\t" + relation)
-                            ##END IF
-                        ##END FOR
-                    ##END IF
-                ##END FOR
-            ###END IF
-        ###END FOR
+            ##END FOR
+        ##END FOR
+        goDict = dict()
+        for key in relations:
+            inherited = goowl.inherit_to_descendants({go: frozenset(taxa) for go, taxa in ownTaxa[key].items()})
+            for go in inherited:
+                goDict.setdefault(go, dict())[key] = inherited[go]
+            ##END FOR
+        ##END FOR
 
+        ## taxa of each constraint taxon, Union taxa split in their members
+        taxaOf = dict()
+        ## kept taxa of each inherited set, shared by many GO
+        keptOf = dict()
         for go in sorted(goDict.keys()):
-
-            listPurged = set()
-            listIterTaxa = set()
-
-            if 'IN' in goDict[go]:
-                ### discard redundancy
-                for taxonId in goDict[go]['IN']:
-                    taxonName = goDict[go]['IN'][taxonId][1]
-                    if 'NCBITaxon_Union_' in taxonId:
-                        listOfNames = taxonName.split(' or ')
-                        for taxName in listOfNames:
-                            if taxName.strip() in fullList:
-                                listOfIds = fullList[taxName.strip()]
-                                for i in listOfIds:
-                                    if i == '629395':
-                                        continue
-                                    ##END IF
-                                    listIterTaxa.add((i,taxName,taxonId))
-                                ##END FOR
-                            else:
-                                print(taxName.strip()," NOT FOUND")
-                                sys.exit()
-                            ##END IF
-                        ##END FOR
-                    ##END IF
-                    else:
-                        listIterTaxa.add((taxonId.split('_')[1].strip(),taxonName,taxonId))
-                    ##END IF
-                ##END FOR
-            ##END IF
-
-            for tax in listIterTaxa:
-                try:
-                    parents = ancestors[tax[0]]
-                    for anc in parents:
-                        resTaxon = [i for i in listIterTaxa if anc in i]
-                        ## or resTaxon = [i for i in listIterTaxa if anc == list(i)[0]] to serach only in index 0 of the tuple
-                        ## it returns a list of hits
-                        if bool(resTaxon):
-                            listPurged.add(resTaxon[0])
-                            break
+            details = goowl.go_single_details(go)
+            ### discard redundancy: among the taxa of only in taxon keep the most specific ones,
+            ### among the taxa of never in taxon the most general ones; taxa not in the taxonomy are discarded
+            for relation in ('IN', 'NEVER'):
+                if relation not in goDict[go]:
+                    continue
+                ##END IF
+                if (relation, goDict[go][relation]) not in keptOf:
+                    listIterTaxa = set()
+                    for taxonId in goDict[go][relation]:
+                        if taxonId not in taxaOf:
+                            taxaOf[taxonId] = split_union(Taxa, taxonId, taxonNames[taxonId])
                         ##END IF
+                        listIterTaxa.update(taxaOf[taxonId])
                     ##END FOR
-                except:
-                    listPurged.add(tax)
-                ##END TRY
-            ##END FOR
-
-            for tax in listIterTaxa:
-                if tax not in listPurged:
-                    firstreplace = goDict[go]['IN'][tax[2]][2].replace("PLACEHOLDERID", tax[0])
-                    secondReplace = firstreplace.replace("PLACEHOLDERNAME", tax[1])
-                    out.write(secondReplace + "\n")
-                ##END IF
-            ##END FOR
-
-            listPurged = set()
-            listIterTaxa = set()
-            if 'NEVER' in goDict[go]:
-                ### discard redundancy
-                for taxonId in goDict[go]['NEVER']:
-                    taxonName = goDict[go]['NEVER'][taxonId][1]
-                    if 'NCBITaxon_Union_' in taxonId:
-                        listOfNames = taxonName.split(' or ')
-                        for taxName in listOfNames:
-                            if taxName.strip() in fullList:
-                                listOfIds = fullList[taxName.strip()]
-                                for i in listOfIds:
-                                    if i == '629395':
-                                        continue
-                                    ##END IF
-                                    listIterTaxa.add((i,taxName,taxonId))
-                                ##END FOR
-                            else:
-                                print(taxName.strip()," NOT FOUND")
-                                sys.exit()
-                            ##END IF
-                        ##END FOR
-                    ##END IF
+                    if relation == 'IN':
+                        listKept = Taxa.get_most_specific(tax[0] for tax in listIterTaxa)
                     else:
-                        listIterTaxa.add((taxonId.split('_')[1].strip(),taxonName,taxonId))
+                        listKept = Taxa.get_most_general(tax[0] for tax in listIterTaxa)
                     ##END IF
-                ##END FOR
-            ##END IF
-            for tax in listIterTaxa:
-                try:
-                    parents = ancestors[tax[0]]
-                    for anc in parents:
-                        if bool([i for i in listIterTaxa if anc in i]):
-                        #if anc in listIterTaxa:
-                            listPurged.add(tax)
-                            break
-                        ##END IF
-                    ##END FOR
-                except:
-                    listPurged.add(tax)
-                ##END TRY
-            ##END FOR
-            for tax in listIterTaxa:
-                if tax not in listPurged:
-                    firstreplace = goDict[go]['NEVER'][tax[2]][2].replace("PLACEHOLDERID", tax[0])
-                    secondReplace = firstreplace.replace("PLACEHOLDERNAME", tax[1])
-                    out.write(secondReplace + "\n")
+                    ### the root (its own father in nodes.dmp) never gives a constraint
+                    listKept.discard('1')
+                    keptOf[(relation, goDict[go][relation])] = [tax for tax in sorted(listIterTaxa) if tax[0] in listKept]
                 ##END IF
+                for tax in keptOf[(relation, goDict[go][relation])]:
+                    out.write(f'{go}\t{details["name"]}\t{details["namespace"]}\t{tax[0]}\t{tax[1]}\t{relations[relation]}\n')
+                ##END FOR
             ##END FOR
         ##END FOR
     ##END WITH
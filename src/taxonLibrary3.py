@@ -9,24 +9,158 @@
 # Licence:     GPL
 # -------------------------------------------------------------------------------
 
+import os
+import re
 import sys
+import json
+import mmap
 import time
+from array import array
+from itertools import accumulate
+from collections.abc import Mapping, Set
+
+# compiled copies of nodes.dmp, merged.dmp and names.dmp are kept in this folder next to nodes.dmp,
+# each one valid as long as size and modification time of its .dmp file do not change
+CACHE_DIR = '.taxon_cache'
+CACHE_MAGIC = b'FTXTAXC1'
+CACHE_VERSION = 2
+
+# the .dmp files are read in blocks of whole lines, taking only the needed columns of each line
+BLOCK_SIZE = 1 << 24
+NODES_LINE = re.compile(rb'^(\d+)\t\|\t(\d+)\t\|\t([^\t\n]*)\t', re.MULTILINE)
+MERGED_LINE = re.compile(rb'^(\d+)\t\|\t(\d+)\t', re.MULTILINE)
+NAMES_LINE = re.compile(rb'^(\d+)\t\|\t([^\t\n]*)\t\|\t[^\t\n]*\t\|\t([^\t\n]*)\t', re.MULTILINE)
+
+
+def read_blocks(file_name, block_size=BLOCK_SIZE):
+    # yield the content of a file in blocks of about block_size bytes ending at the end of a line
+    with open(file_name, 'rb') as fin:
+        rest = b''
+        while True:
+            block = fin.read(block_size)
+            if not block:
+                break
+            # END IF
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            yield block[:end]
+        # END WHILE
+        if rest:
+            yield rest + b'\n'
+        # END IF
+    # END WITH
+    fin.close()
+# END DEF
+
+
+class TaxaView(Set):
+    # read-only set of taxids answered from the tree arrays of a Taxon, nothing is materialised
+    def __init__(self, contains, iterate, size):
+        self.__contains = contains
+        self.__iterate = iterate
+        self.__size = size
+
+    # END DEF
+
+    def __contains__(self, node):
+        return self.__contains(node)
+    # END DEF
+
+
+    def __iter__(self):
+        return self.__iterate()
+    # END DEF
+
+
+    def __len__(self):
+        return self.__size
+    # END DEF
+
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # set operations (|, &, -) return plain sets
+        return set(iterable)
+    # END DEF
+
+# END CLASS
+
+
+class TaxaViewMap(Mapping):
+    # read-only taxid -> TaxaView mapping, the views are created on access
+    def __init__(self, contains, iterate, size, view):
+        self.__contains = contains
+        self.__iterate = iterate
+        self.__size = size
+        self.__view = view
+
+    # END DEF
+
+    def __contains__(self, node):
+        return self.__contains(node)
+    # END DEF
+
+
+    def __getitem__(self, node):
+        if not self.__contains(node):
+            raise KeyError(node)
+        # END IF
+
+        return self.__view(node)
+    # END DEF
+
+
+    def __iter__(self):
+        return self.__iterate()
+    # END DEF
+
+
+    def __len__(self):
+        return self.__size
+    # END DEF
+
+# END CLASS
 
-sys.setrecursionlimit(10000)
 
 class Taxon:
-    def __init__(self, taxon_nodes, merged, file_of_names):
+    def __init__(self, taxon_nodes, merged, file_of_names, cache=True):
         self.__taxon_nodes_file = taxon_nodes
         self.__merged_file = merged
         self.__names_file = file_of_names
-        self.__son_father = {}
-        self.__father_son = {}
-        self.__son_ancestors = {}
-        self.__father_descendants = {}
+        self.__cache = cache
+        # nodes are numbered 0..n-1 in the order of nodes.dmp, every array below is indexed by that number
+        self.__taxids = array('i')          # node -> taxid
+        self.__index = array('i')           # taxid -> node, -1 if the taxid is not a node
+        self.__parent = array('i')          # node -> father node, the root is its own father
+        self.__rank = array('H')            # node -> code of its rank in self.__ranks
+        self.__ranks = []
+        self.__child_start = array('i')     # children of node v are self.__children[child_start[v]:child_start[v + 1]]
+        self.__children = array('i')
+        self.__pre = array('i')             # node -> preorder position, -1 if not connected to the root
+        self.__last = array('i')            # node -> last preorder position of its subtree
+        self.__order = array('i')           # preorder position -> node
+        self.__depth = array('i')           # node -> distance from the root, -1 if not connected to the root
+        self.__jump = []                    # jump[k][v] = 2^k-th ancestor of v (root for the ones above it), built on first use
+        self.__rank_tables = {}             # rank -> (node -> nearest ancestor at that rank, -1 if none), built on first use
+        self.__reference_tables = {}        # last reference nodes -> (node -> nearest of them among node and its ancestors, -1 if none)
+        self.__root = -1
         self.__merged_map = {}
+        self.__merged_loaded = False
+        # names.dmp as a table of records: name i is name_blob[name_offsets[i]:name_offsets[i + 1]]
+        self.__name_blob = b''
+        self.__name_offsets = array('q', [0])
+        self.__name_taxid = array('i')      # record -> taxid
+        self.__name_class = array('B')      # record -> code of its name class in self.__name_classes
+        self.__name_classes = []
+        self.__by_name = array('i')         # records sorted by name
+        self.__by_folded = array('i')       # records sorted by case folded name
+        self.__substring_ids = {}           # memo of the substring searches of get_ids
+        self.__by_taxid = array('i')        # records sorted by taxid, file order for the same taxid
+        self.__taxid_start = array('i')     # records of taxid t are by_taxid[taxid_start[t]:taxid_start[t + 1]]
+        self.__names_loaded = False
         self.__name_id_map = {}
         self.__id_name_map = {}
-        self.__rank_list = {}
         self.__valid_ranks = set()
         self.__valid_name_class = set()
         self.__loading()
@@ -34,268 +168,1005 @@ class Taxon:
     # END DEF
 
     def __loading(self):
-        with open(self.__taxon_nodes_file, 'r') as fin:
-            for line in fin:
-                values = line.split('|')
-                son = values[0].strip()
-                father = values[1].strip()
-                rank = values[2].strip()
-                if son not in self.__son_father:
-                    self.__son_father[son] = father
-                if father not in self.__father_son:
-                    self.__father_son[father] = []
-                self.__father_son[father].append(son)
-                self.__rank_list[son] = rank
-                if rank != 'no rank' and 'species' not in rank and 'sub' not in rank:
-                    self.__valid_ranks.add(rank)
+        # only nodes.dmp is needed by every caller, merged.dmp and names.dmp are loaded on first use
+        self.__load_nodes()
+    # END DEF
+
+
+    def __need_merged(self):
+        if not self.__merged_loaded:
+            self.__load_merged()
+            self.__merged_loaded = True
+        # END IF
+    # END DEF
+
+
+    def __need_names(self):
+        if not self.__names_loaded:
+            self.__load_names()
+            self.__names_loaded = True
+        # END IF
+    # END DEF
+
+
+    def __load_nodes(self):
+        cached = self.__read_cache(self.__taxon_nodes_file)
+        if cached is not None:
+            header, arrays = cached
+            self.__ranks = header['ranks']
+            self.__valid_ranks = set(header['valid_ranks'])
+            self.__root = header['root']
+            self.__taxids = arrays['taxids']
+            self.__index = arrays['index']
+            self.__parent = arrays['parent']
+            self.__rank = arrays['rank']
+            self.__child_start = arrays['child_start']
+            self.__children = arrays['children']
+            self.__pre = arrays['pre']
+            self.__last = arrays['last']
+            self.__order = arrays['order']
+            self.__depth = arrays['depth']
+
+            return
+        # END IF
+
+        rank_code = {}
+        fathers = array('i')
+        for block in read_blocks(self.__taxon_nodes_file):
+            lines = NODES_LINE.findall(block)
+            if not lines:
+                continue
+            # END IF
+            sons, block_fathers, ranks = zip(*lines)
+            self.__taxids.extend(map(int, sons))
+            fathers.extend(map(int, block_fathers))
+            for rank in dict.fromkeys(ranks):
+                if rank not in rank_code:
+                    rank_code[rank] = len(self.__ranks)
+                    self.__ranks.append(rank.decode('utf-8'))
+                # END IF
             # END FOR
-        # END WITH
-        fin.close()
+            self.__rank.extend(map(rank_code.__getitem__, ranks))
+        # END FOR
+        for rank in self.__ranks:
+            if rank != 'no rank' and 'species' not in rank and 'sub' not in rank:
+                self.__valid_ranks.add(rank)
+            # END IF
+        # END FOR
         self.__valid_ranks.add('species')
+        self.__build(fathers)
+        self.__write_cache(self.__taxon_nodes_file,
+                           {'ranks': self.__ranks, 'valid_ranks': sorted(self.__valid_ranks), 'root': self.__root},
+                           [('taxids', self.__taxids), ('index', self.__index), ('parent', self.__parent),
+                            ('rank', self.__rank), ('child_start', self.__child_start), ('children', self.__children),
+                            ('pre', self.__pre), ('last', self.__last), ('order', self.__order), ('depth', self.__depth)])
+    # END DEF
+
+
+    def __load_merged(self):
+        cached = self.__read_cache(self.__merged_file)
+        if cached is not None:
+            header, arrays = cached
+            self.__merged_map = dict(zip(map(str, arrays['old']), map(str, arrays['new'])))
+
+            return
+        # END IF
 
-        # Parse merged file
-        with open(self.__merged_file) as fin:
-            for line in fin:
-                values = line.split('|')
-                orig = values[0].strip()
-                substitute = values[1].strip()
-                self.__merged_map[orig] = substitute
+        for block in read_blocks(self.__merged_file):
+            self.__merged_map.update((orig.decode('ascii'), substitute.decode('ascii')) for orig, substitute in MERGED_LINE.findall(block))
+        # END FOR
+        self.__write_cache(self.__merged_file, {},
+                           [('old', array('i', map(int, self.__merged_map.keys()))),
+                            ('new', array('i', map(int, self.__merged_map.values())))])
+    # END DEF
+
+
+    def __load_names(self):
+        cached = self.__read_cache(self.__names_file)
+        if cached is not None:
+            header, arrays = cached
+            self.__name_classes = header['classes']
+            self.__valid_name_class = set(self.__name_classes)
+            self.__name_blob = arrays['blob']
+            self.__name_offsets = arrays['offsets']
+            self.__name_taxid = arrays['taxid']
+            self.__name_class = arrays['class']
+            self.__by_name = arrays['by_name']
+            self.__by_folded = arrays['by_folded']
+            self.__by_taxid = arrays['by_taxid']
+            self.__taxid_start = arrays['taxid_start']
+
+            return
+        # END IF
+
+        class_code = {}
+        names = []
+        for block in read_blocks(self.__names_file):
+            lines = NAMES_LINE.findall(block)
+            if not lines:
+                continue
+            # END IF
+            taxids, block_names, classes = zip(*lines)
+            self.__name_taxid.extend(map(int, taxids))
+            names.extend(block_names)
+            for name_class in dict.fromkeys(classes):
+                if name_class not in class_code:
+                    class_code[name_class] = len(self.__name_classes)
+                    self.__name_classes.append(name_class.decode('utf-8'))
+                # END IF
             # END FOR
-        # END WITH
-        fin.close()
-
-        # Parse names file
-        with open(self.__names_file, 'r') as names:
-            for line in names:
-                line = line.strip()
-                values = line.split('\t')
-                name = values[2]
-                taxon_id = values[0]
-                name_class = values[6]
-                if name not in self.__name_id_map:
-                    self.__name_id_map[name] = set()
-                if taxon_id not in self.__id_name_map:
-                    self.__id_name_map[taxon_id] = set()
-                self.__name_id_map[name].add(taxon_id)
-                self.__id_name_map[taxon_id].add((name, name_class))
-                self.__valid_name_class.add(name_class)
+            self.__name_class.extend(map(class_code.__getitem__, classes))
+        # END FOR
+        self.__name_blob = b''.join(names)
+        self.__name_offsets = array('q', accumulate(map(len, names), initial=0))
+        self.__valid_name_class = set(self.__name_classes)
+        self.__index_names(names)
+        self.__write_cache(self.__names_file, {'classes': self.__name_classes},
+                           [('blob', array('B', self.__name_blob)), ('offsets', self.__name_offsets),
+                            ('taxid', self.__name_taxid), ('class', self.__name_class), ('by_name', self.__by_name),
+                            ('by_folded', self.__by_folded), ('by_taxid', self.__by_taxid), ('taxid_start', self.__taxid_start)])
+    # END DEF
+
+
+    def __index_names(self, names):
+        # orders of the name records by name and by taxid
+        records = len(self.__name_taxid)
+        self.__by_name = array('i', sorted(range(records), key=names.__getitem__))
+        folded = [name.decode('utf-8').casefold().encode('utf-8') for name in names]
+        self.__by_folded = array('i', sorted(range(records), key=folded.__getitem__))
+        self.__by_taxid = array('i', sorted(range(records), key=self.__name_taxid.__getitem__))
+        self.__taxid_start = array('i', [0]) * (max(self.__name_taxid, default=0) + 2)
+        for taxid in self.__name_taxid:
+            self.__taxid_start[taxid + 1] += 1
+        # END FOR
+        for taxid in range(len(self.__taxid_start) - 1):
+            self.__taxid_start[taxid + 1] += self.__taxid_start[taxid]
+        # END FOR
+    # END DEF
+
+
+    def __cache_file(self, source, table=None):
+        # the cache of source itself, or of a table computed from it
+        name = os.path.basename(source) if table is None else f'{os.path.basename(source)}.{table}'
+
+        return os.path.join(os.path.dirname(os.path.abspath(self.__taxon_nodes_file)), CACHE_DIR, name.replace(' ', '_') + '.cache')
+    # END DEF
+
+
+    def __read_cache(self, source, table=None):
+        # header and memory mapped arrays of the cache of source, None if missing or out of date
+        if not self.__cache:
+            return None
+        # END IF
+
+        try:
+            with open(self.__cache_file(source, table), 'rb') as fin:
+                if fin.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    return None
+                # END IF
+                size = int.from_bytes(fin.read(8), 'little')
+                header = json.loads(fin.read(size).decode('utf-8'))
+                stat = os.stat(source)
+                if header['version'] != CACHE_VERSION or header['byteorder'] != sys.byteorder or \
+                        header['size'] != stat.st_size or header['mtime'] != stat.st_mtime_ns:
+                    return None
+                # END IF
+                view = memoryview(mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ))
+            # END WITH
+            arrays = {}
+            position = header['data']
+            for name, typecode, length in header['arrays']:
+                end = position + length * array(typecode).itemsize
+                arrays[name] = view[position:end].cast(typecode)
+                position = (end + 7) // 8 * 8
+            # END FOR
+        except (OSError, ValueError, KeyError):
+            return None
+        # END TRY
+
+        return header, arrays
+    # END DEF
+
+
+    def __write_cache(self, source, header, arrays, table=None):
+        # a read-only taxonomy folder only costs the cache, never the run
+        if not self.__cache:
+            return
+        # END IF
+
+        cache_file = self.__cache_file(source, table)
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            stat = os.stat(source)
+            header = dict(header, version=CACHE_VERSION, byteorder=sys.byteorder, size=stat.st_size, mtime=stat.st_mtime_ns,
+                          arrays=[(name, arr.typecode, len(arr)) for name, arr in arrays])
+            # the arrays start at a multiple of 8 bytes after the header, its length is fixed with a first encoding
+            header['data'] = 0
+            size = len(json.dumps(header).encode('utf-8')) + 32
+            header['data'] = (len(CACHE_MAGIC) + 8 + size + 7) // 8 * 8
+            encoded = json.dumps(header).encode('utf-8').ljust(size)
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(tmp_file, 'wb') as out:
+                out.write(CACHE_MAGIC)
+                out.write(size.to_bytes(8, 'little'))
+                out.write(encoded)
+                for name, arr in arrays:
+                    out.write(bytes(-out.tell() % 8))
+                    out.write(arr)
+                # END FOR
+            # END WITH
+            os.replace(tmp_file, cache_file)
+        except OSError as error:
+            print(f'WARNING: taxonomy cache {cache_file} not written: {error}', file=sys.stderr)
+        # END TRY
+    # END DEF
+
+
+    def __build(self, fathers):
+        # father taxids -> parent array, children in CSR form and preorder intervals
+        n = len(self.__taxids)
+        taxids = self.__taxids
+        max_taxid = max(max(taxids, default=0), max(fathers, default=0))
+        index = array('i', [-1]) * (max_taxid + 1)
+        # backwards, so that the first line of a duplicated taxid wins
+        for v in range(n - 1, -1, -1):
+            index[taxids[v]] = v
+        # END FOR
+        parent = array('i', map(index.__getitem__, fathers))
+        root = index[1] if len(index) > 1 else -1
+
+        # children grouped by father in file order, without the root loop and the duplicated lines
+        children = array('i', (v for v in sorted(range(n), key=parent.__getitem__)
+                               if parent[v] != -1 and parent[v] != v and index[taxids[v]] == v))
+        counts = array('i', [0]) * n
+        for v in children:
+            counts[parent[v]] += 1
+        # END FOR
+        child_start = array('i', accumulate(counts, initial=0))
+
+        order = array('i')
+        stack = [root] if root != -1 else []
+        while stack:
+            v = stack.pop()
+            order.append(v)
+            stack.extend(reversed(children[child_start[v]:child_start[v + 1]]))
+        # END WHILE
+        pre = array('i', [-1]) * n
+        for position, v in enumerate(order):
+            pre[v] = position
+        # END FOR
+        last = array('i', pre)
+        for v in reversed(order):
+            father = parent[v]
+            if last[v] > last[father]:
+                last[father] = last[v]
+            # END IF
+        # END FOR
+        depth = array('i', [-1]) * n
+        if root != -1:
+            depth[root] = 0
+        # END IF
+        for v in order[1:]:
+            depth[v] = depth[parent[v]] + 1
+        # END FOR
+
+        self.__index = index
+        self.__parent = parent
+        self.__root = root
+        self.__children = children
+        self.__child_start = child_start
+        self.__order = order
+        self.__pre = pre
+        self.__last = last
+        self.__depth = depth
+    # END DEF
+
+
+    def __lifting(self):
+        # binary lifting table, log2(max depth) + 1 levels
+        if not self.__jump:
+            parent = array('i', (self.__parent[v] if self.__depth[v] > 0 else v for v in range(len(self.__parent))))
+            self.__jump.append(parent)
+            for k in range(1, max(max(self.__depth, default=0), 1).bit_length()):
+                previous = self.__jump[k - 1]
+                self.__jump.append(array('i', (previous[previous[v]] for v in range(len(previous)))))
             # END FOR
-        # END WITH
-        names.close()
+        # END IF
+
+        return self.__jump
     # END DEF
 
+
+    def __contains(self, a, v):
+        # a is v or one of its ancestors
+        return self.__pre[a] != -1 and self.__pre[v] != -1 and self.__pre[a] <= self.__pre[v] <= self.__last[a]
+    # END DEF
+
+
+    def __lca(self, a, b):
+        if self.__contains(a, b):
+            return a
+        # END IF
+        if self.__contains(b, a):
+            return b
+        # END IF
+        jump = self.__lifting()
+        for k in range(len(jump) - 1, -1, -1):
+            if not self.__contains(jump[k][a], b):
+                a = jump[k][a]
+            # END IF
+        # END FOR
+
+        return jump[0][a]
+    # END DEF
+
+
+    def __node(self, node):
+        # taxid string -> node number, -1 if it is not in nodes.dmp
+        try:
+            taxid = int(node)
+        except (TypeError, ValueError):
+            return -1
+        # END TRY
+        if taxid < 0 or taxid >= len(self.__index):
+            return -1
+        # END IF
+
+        return self.__index[taxid]
+    # END DEF
+
+
+    def __taxid(self, v):
+        return str(self.__taxids[v])
+    # END DEF
+
+
     def merging(self):
+        self.__need_merged()
+
         return self.__merged_map
     # END DEF
 
 
-    def ancestors_full_list(self):  # OK (12 seconds)
-        for son, father in self.__son_father.items():
-            if son not in self.__son_ancestors:
-                self.__son_ancestors[son] = set()
+    def has_node(self, node):  # OK (<< 1 second)
+        return self.__node(node) != -1
+    # END DEF
+
+
+    def resolve(self, node):  # OK (<< 1 second)
+        # node itself if it is in nodes.dmp, else the node it has been merged into (following
+        # chains of merges), None if it is unknown
+        seen = set()
+        while not self.has_node(node):
+            self.__need_merged()
+            if node not in self.__merged_map or node in seen:
+                return None
             # END IF
+            seen.add(node)
+            node = self.__merged_map[node]
+        # END WHILE
 
-            self.__son_ancestors[son].add(father)
-            while father != '1':
-                father = self.__son_father[father]
-                self.__son_ancestors[son].add(father)
-            # END WHILE
-        # END FOR
+        return node
+    # END DEF
+
+
+    def is_ancestor(self, ancestor, node):  # OK (<< 1 second)
+        # same as ancestor in self.get_all_ancestors(node), with an interval test
+        a = self.__node(ancestor)
+        v = self.__node(node)
+        if a == -1 or v == -1 or self.__pre[a] == -1 or self.__pre[v] == -1:
+            return False
+        # END IF
+        if v == self.__root:
+            return a == self.__root
+        # END IF
+
+        return self.__pre[a] < self.__pre[v] <= self.__last[a]
+    # END DEF
+
+
+    def __connected(self, node):
+        v = self.__node(node)
 
-        return self.__son_ancestors
+        return v != -1 and self.__pre[v] != -1
     # END DEF
 
 
-    def descendants_full_list(self):  # OK (25 secondi)
-        fathers = list(self.__father_son.keys())
-        for father in fathers:
-            if father not in self.__father_descendants:
-                self.__father_descendants[father] = self.get_all_descendants(father)
+    def __iter_lineage(self, v):
+        # ancestors of node v from its father up to the root (the root only for the root itself)
+        while True:
+            v = self.__parent[v]
+            yield self.__taxid(v)
+            if v == self.__root:
+                break
             # END IF
-        # END FOR
+        # END WHILE
+    # END DEF
+
+
+    def __lineage_view(self, node):
+        v = self.__node(node)
+
+        return TaxaView(lambda ancestor: self.is_ancestor(ancestor, node), lambda: self.__iter_lineage(v), max(self.__depth[v], 1))
+    # END DEF
+
+
+    def __subtree_view(self, node):
+        v = self.__node(node)
 
-        return self.__father_descendants
+        return TaxaView(lambda descendant: descendant != node and self.is_ancestor(node, descendant),
+                        lambda: self.iter_descendants(node), self.__last[v] - self.__pre[v])
+    # END DEF
+
+
+    def __fathers(self):
+        return [v for v in self.__order if self.__child_start[v + 1] > self.__child_start[v] or v == self.__root]
+    # END DEF
+
+
+    def ancestors_full_list(self):  # OK (<< 1 second)
+        # taxid -> set-like view of its ancestors (as get_all_ancestors) for every taxon in the tree;
+        # each view is a start node on the shared parent array, membership is an interval test
+        return TaxaViewMap(self.__connected, lambda: map(self.__taxid, self.__order), len(self.__order), self.__lineage_view)
+    # END DEF
+
+
+    def descendants_full_list(self):  # OK (<< 1 second)
+        # taxid -> set-like view of its descendants (as get_all_descendants) for every taxon with children
+        fathers = self.__fathers()
+        keys = set(map(self.__taxid, fathers))
+
+        return TaxaViewMap(keys.__contains__, lambda: map(self.__taxid, fathers), len(fathers), self.__subtree_view)
     # END DEF
 
 
     def get_all_ancestors(self, node):  # OK (<< 1 second)
         ancestors = set()
-        cur_node = node
-        if node not in self.__son_father:
+        v = self.__node(node)
+        if v == -1:
             return ancestors
         # END IF
 
         while True:
-            cur_node = self.__son_father[cur_node]
-            if cur_node == '1':
-                ancestors.add(cur_node)
+            v = self.__parent[v]
+            if v == -1:
+                break
+            # END IF
+            ancestors.add(self.__taxid(v))
+            if v == self.__root:
                 break
             # END IF
-
-            ancestors.add(cur_node)
         # END WHILE
 
         return ancestors
     # END DEF
 
 
-    def get_all_descendants(self, starting_node, descendants=set(), first=True):  # OK (<= 1 second)
-        if first:
-            descendants = set()
+    def __subtree(self, node):
+        # preorder positions start:end of the descendants of node, empty if node is not in the tree
+        v = self.__node(node)
+        if v == -1 or self.__pre[v] == -1:
+            return 0, 0
         # END IF
 
-        if starting_node == '1':
-            for child in self.get_children(starting_node):
-                descendants.update(self.get_all_descendants(child, descendants, False))
+        return self.__pre[v] + 1, self.__last[v] + 1
+    # END DEF
+
+
+    def iter_descendants(self, node):  # OK (<< 1 second)
+        # descendants of node one at a time, in preorder, without building a set
+        start, end = self.__subtree(node)
+        for position in range(start, end):
+            yield self.__taxid(self.__order[position])
+        # END FOR
+    # END DEF
+
+
+    def get_descendants_array(self, node):  # OK (<< 1 second)
+        # taxids (as integers) of the descendants of node in preorder, a copy of one contiguous slice
+        start, end = self.__subtree(node)
+
+        return array('i', map(self.__taxids.__getitem__, self.__order[start:end]))
+    # END DEF
+
+
+    def iter_descendants_many(self, nodes, include_roots=False):  # OK (<< 1 second)
+        # descendants of several taxa, each taxon once: the preorder intervals are sorted and the
+        # ones nested in a previous interval are skipped
+        intervals = []
+        for node in nodes:
+            v = self.__node(node)
+            if v != -1 and self.__pre[v] != -1:
+                intervals.append((self.__pre[v] if include_roots else self.__pre[v] + 1, self.__last[v] + 1))
+            # END IF
+        # END FOR
+        covered = 0
+        for start, end in sorted(intervals):
+            for position in range(max(start, covered), end):
+                yield self.__taxid(self.__order[position])
             # END FOR
+            covered = max(covered, end)
+        # END FOR
+    # END DEF
 
-        else:
-            father = starting_node
-            descendants.add(father)
-            if father in self.__father_son:
-                for child in self.__father_son[father]:
-                    descendants.update(self.get_all_descendants(child, descendants, False))
-                # END FOR
 
+    def __preorder_items(self, nodes):
+        # (preorder position, end of the subtree, node) of the nodes in the tree sorted by preorder,
+        # and the nodes of nodes.dmp outside the tree
+        items = []
+        detached = set()
+        for node in nodes:
+            v = self.__node(node)
+            if v == -1:
+                continue
+            # END IF
+            if self.__pre[v] == -1:
+                detached.add(node)
             else:
-                descendants.add(father)
+                items.append((self.__pre[v], self.__last[v], node))
             # END IF
+        # END FOR
+        items.sort()
+
+        return items, detached
+    # END DEF
+
+
+    def get_most_general(self, nodes):  # OK (<< 1 second)
+        # the nodes that have none of their ancestors among nodes; nodes not in nodes.dmp are left out.
+        # Sorted by preorder, a node is under an ancestor among nodes iff it is inside the interval
+        # of the last node kept
+        items, most_general = self.__preorder_items(nodes)
+        kept_pre = kept_last = -1
+        for pre, last, node in items:
+            if kept_pre < pre <= kept_last:
+                continue
+            # END IF
+            most_general.add(node)
+            kept_pre, kept_last = pre, last
+        # END FOR
+
+        return most_general
+    # END DEF
+
+
+    def get_most_specific(self, nodes):  # OK (<< 1 second)
+        # the nodes that have none of their descendants among nodes; nodes not in nodes.dmp are left out.
+        # Sorted by preorder, a node has a descendant among nodes iff the next position is inside its interval
+        items, most_specific = self.__preorder_items(nodes)
+        positions = sorted(set(pre for pre, last, node in items))
+        following = dict(zip(positions, positions[1:]))
+        for pre, last, node in items:
+            if pre not in following or following[pre] > last:
+                most_specific.add(node)
+            # END IF
+        # END FOR
+
+        return most_specific
+    # END DEF
+
+
+    def get_all_descendants(self, starting_node, descendants=None, first=True):  # OK (<< 1 second)
+        # the subtree is the preorder interval of starting_node; descendants and first are
+        # kept for the callers of the old recursive version
+        result = set(self.iter_descendants(starting_node))
+        if not first and descendants is not None:
+            descendants.update(result)
+
+            return descendants
         # END IF
 
-        if first:
-            descendants.discard(starting_node)
+        return result
+    # END DEF
+
+
+    def __rank_table(self, rank):
+        # nearest proper ancestor (root excluded) of every node whose rank contains rank and is a valid
+        # rank, computed top-down in one pass over the preorder and kept in the cache folder
+        if rank not in self.__rank_tables:
+            cached = self.__read_cache(self.__taxon_nodes_file, f'rank_{rank}')
+            if cached is not None:
+                self.__rank_tables[rank] = cached[1]['ancestors']
+            else:
+                matching = {code for code, name in enumerate(self.__ranks) if rank in name and name in self.__valid_ranks}
+                parent = self.__parent
+                node_rank = self.__rank
+                table = array('i', [-1]) * len(self.__taxids)
+                for v in self.__order[1:]:
+                    father = parent[v]
+                    if father != self.__root and node_rank[father] in matching:
+                        table[v] = father
+                    else:
+                        table[v] = table[father]
+                    # END IF
+                # END FOR
+                self.__rank_tables[rank] = table
+                self.__write_cache(self.__taxon_nodes_file, {}, [('ancestors', table)], f'rank_{rank}')
+            # END IF
         # END IF
 
-        return descendants
+        return self.__rank_tables[rank]
+    # END DEF
+
+
+    def get_canonical_ranks(self):  # OK (<< 1 second)
+        # ranks accepted by get_ancestor_at_rank
+        return sorted(self.__valid_ranks)
     # END DEF
 
 
     def get_ancestor_at_rank(self, node, rank):  # OK (<< 1 second)
-        if rank not in self.__valid_ranks or node not in self.__rank_list or node not in self.__son_father or rank in self.__rank_list[node]:
+        v = self.__node(node)
+        if rank not in self.__valid_ranks or v == -1 or rank in self.__ranks[self.__rank[v]]:
             return None
         # END IF
+        ancestor = self.__rank_table(rank)[v]
+        if ancestor == -1:
+            return None
+        # END IF
+
+        return self.__taxid(ancestor)
+    # END DEF
+
 
-        if self.__rank_list[node] == rank:
-            return node
+    def get_ancestors_at_rank(self, nodes, rank):  # OK (<< 1 second)
+        # get_ancestor_at_rank for many taxa, in the same order
+        if rank not in self.__valid_ranks:
+            return [None for node in nodes]
         # END IF
+        self.__rank_table(rank)
 
-        queue = [node]
-        node_found = None
+        return [self.get_ancestor_at_rank(node, rank) for node in nodes]
+    # END DEF
 
-        while len(queue) > 0:
-            cur_node = queue.pop(0)
-            if cur_node == '1':
-                break
-            # END IF
-            if cur_node in self.__rank_list:
-                if rank not in self.__rank_list[cur_node] or self.__rank_list[cur_node] not in self.__valid_ranks:
-                    queue.append(self.__son_father[cur_node])
-                else:
-                    node_found = cur_node
-                    break
+
+    def __reference_table(self, references):
+        # nearest reference node of every node (the node itself or its closest ancestor in references),
+        # computed top-down in one pass over the preorder. Only the table of the last partition is kept,
+        # in memory: rebuilding it is a single pass, and a what-if run may evaluate many partitions
+        reference_nodes = sorted({v for v in map(self.__node, references) if v != -1})
+        key = tuple(reference_nodes)
+        if key not in self.__reference_tables:
+            table = array('i', [-1]) * len(self.__taxids)
+            for v in reference_nodes:
+                table[v] = v
+            # END FOR
+            parent = self.__parent
+            for v in self.__order[1:]:
+                if table[v] == -1:
+                    table[v] = table[parent[v]]
                 # END IF
-            # END IF
-        # END WHILE
+            # END FOR
+            self.__reference_tables = {key: table}
+        # END IF
 
-        return node_found
+        return self.__reference_tables[key]
     # END DEF
 
 
-    def get_children(self, node):  # OK  (<< 1 second)
-        try:
-            children = self.__father_son[node].copy()
-            if node == '1':
-                children.remove('1')
+    def get_nearest_references(self, nodes, references):  # OK (<< 1 second)
+        # for each of nodes, the nearest taxon of references among the node itself and its ancestors
+        # (the node clustering it in a taxonConstraintsDef.txt partition), None if it reaches none of them
+        table = self.__reference_table(references)
+        nearest = []
+        for node in nodes:
+            v = self.__node(node)
+            if v == -1 or table[v] == -1:
+                nearest.append(None)
+            else:
+                nearest.append(self.__taxid(table[v]))
             # END IF
+        # END FOR
+
+        return nearest
+    # END DEF
+
 
-            return children
-        except KeyError:
+    def get_children(self, node):  # OK  (<< 1 second)
+        v = self.__node(node)
+        if v == -1 or self.__child_start[v + 1] == self.__child_start[v]:
             return set()
-        # END TRY
+        # END IF
+
+        return [self.__taxid(c) for c in self.__children[self.__child_start[v]:self.__child_start[v + 1]]]
     # END DEF
 
 
     def get_father(self, node):  # OK (<< 1 second)
-        try:
-            return self.__son_father[node]
-        except KeyError:
+        v = self.__node(node)
+        if v == -1 or self.__parent[v] == -1:
             return set()
-        # END TRY
+        # END IF
+
+        return self.__taxid(self.__parent[v])
     # END DEF
 
 
-    def get_names_ids_map(self):  # OK (<< 1 second)
-        return self.__name_id_map
+    def __name_bytes(self, record):
+        return bytes(self.__name_blob[self.__name_offsets[record]:self.__name_offsets[record + 1]])
     # END DEF
 
 
-    def get_ids(self, name):  # OK (< 1 second)
-        if name not in self.__name_id_map:
-            for taxon_name in self.__name_id_map.keys():
-                if name in taxon_name:
-                    return self.__name_id_map[taxon_name]
+    def __name_at(self, record):
+        return self.__name_bytes(record).decode('utf-8')
+    # END DEF
+
+
+    def __folded_bytes(self, record):
+        return self.__name_at(record).casefold().encode('utf-8')
+    # END DEF
+
+
+    def __records_of_name(self, name, ignore_case=False):
+        # records whose name is exactly name (after case folding if ignore_case), binary search
+        # on the records sorted by name
+        if ignore_case:
+            key = name.casefold().encode('utf-8')
+            sorted_records = self.__by_folded
+            record_key = self.__folded_bytes
+        else:
+            key = name.encode('utf-8')
+            sorted_records = self.__by_name
+            record_key = self.__name_bytes
+        # END IF
+        low = 0
+        high = len(sorted_records)
+        while low < high:
+            middle = (low + high) // 2
+            if record_key(sorted_records[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+            # END IF
+        # END WHILE
+        records = []
+        while low < len(sorted_records) and record_key(sorted_records[low]) == key:
+            records.append(sorted_records[low])
+            low += 1
+        # END WHILE
+
+        return records
+    # END DEF
+
+
+    def __first_record_containing(self, name):
+        # first record in the order of names.dmp whose name contains name: a scan of the name blob,
+        # skipping the matches that span two consecutive names
+        pattern = re.compile(re.escape(name.encode('utf-8')))
+        offsets = self.__name_offsets
+        position = 0
+        while True:
+            found = pattern.search(self.__name_blob, position)
+            if found is None:
+                return None
+            # END IF
+            # record whose name starts at or before the match
+            low = 0
+            high = len(offsets) - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if offsets[middle] <= found.start():
+                    low = middle
+                else:
+                    high = middle - 1
+                # END IF
+            # END WHILE
+            if found.end() <= offsets[low + 1]:
+                return low
+            # END IF
+            position = found.start() + 1
+        # END WHILE
+    # END DEF
+
+
+    def __records_of_taxid(self, node):
+        try:
+            taxid = int(node)
+        except (TypeError, ValueError):
+            return []
+        # END TRY
+        if taxid < 0 or taxid + 1 >= len(self.__taxid_start):
+            return []
+        # END IF
+
+        return self.__by_taxid[self.__taxid_start[taxid]:self.__taxid_start[taxid + 1]]
+    # END DEF
+
+
+    def get_names_ids_map(self):  # OK (<< 1 second)
+        self.__need_names()
+        if not self.__name_id_map:
+            for record in range(len(self.__name_taxid)):
+                name = self.__name_at(record)
+                if name not in self.__name_id_map:
+                    self.__name_id_map[name] = set()
                 # END IF
+                self.__name_id_map[name].add(str(self.__name_taxid[record]))
             # END FOR
+        # END IF
 
+        return self.__name_id_map
+    # END DEF
+
+
+    def get_exact_ids(self, name, name_class=None, ignore_case=False):  # OK (<< 1 second)
+        # ids having exactly this name (optionally only in name_class, or ignoring the case), None if none
+        self.__need_names()
+        records = self.__records_of_name(name, ignore_case)
+        if name_class is not None:
+            if name_class not in self.__valid_name_class:
+                return None
+            # END IF
+            code = self.__name_classes.index(name_class)
+            records = [record for record in records if self.__name_class[record] == code]
+        # END IF
+        if not records:
             return None
         # END IF
 
-        return self.__name_id_map[name]
+        return {str(self.__name_taxid[record]) for record in records}
+    # END DEF
+
+
+    def get_ids(self, name):  # OK (<< 1 second)
+        ids = self.get_exact_ids(name)
+        if ids is None:
+            # ids of the first name, in the order of names.dmp, containing name
+            if name not in self.__substring_ids:
+                record = self.__first_record_containing(name)
+                self.__substring_ids[name] = self.get_exact_ids(self.__name_at(record)) if record is not None else None
+            # END IF
+            ids = self.__substring_ids[name]
+            if ids is not None:
+                ids = set(ids)
+            # END IF
+        # END IF
+
+        return ids
     # END DEF
 
 
     def get_id_names_map(self):  # OK (<< 1 second)
+        self.__need_names()
+        if not self.__id_name_map:
+            for record in range(len(self.__name_taxid)):
+                taxon_id = str(self.__name_taxid[record])
+                if taxon_id not in self.__id_name_map:
+                    self.__id_name_map[taxon_id] = set()
+                # END IF
+                self.__id_name_map[taxon_id].add((self.__name_at(record), self.__name_classes[self.__name_class[record]]))
+            # END FOR
+        # END IF
+
         return self.__id_name_map
     # END DEF
 
 
     def get_name(self, node, name_class='scientific name'):  # OK (< 1 second)
-        name = None
+        self.__need_names()
+        if name_class not in self.__valid_name_class:
+            return None
+        # END IF
 
-        if name_class not in self.__valid_name_class or node not in self.__id_name_map:
-            return name
+        code = self.__name_classes.index(name_class)
+        for record in self.__records_of_taxid(node):
+            if self.__name_class[record] == code:
+                return self.__name_at(record)
+            # END IF
+        # END FOR
+
+        return None
+    # END DEF
+
+
+    def get_depth(self, node):  # OK (<< 1 second)
+        # number of edges from the root, None if node is not in the tree
+        v = self.__node(node)
+        if v == -1 or self.__depth[v] == -1:
+            return None
         # END IF
 
-        for tp in self.__id_name_map[node]:
-            if tp[1] == name_class:
-                name = tp[0]
-                break
+        return self.__depth[v]
+    # END DEF
+
+
+    def get_kth_ancestor(self, node, k):  # OK (<< 1 second)
+        # ancestor k levels above node (node itself for k = 0), None if node is less than k levels deep
+        v = self.__node(node)
+        if v == -1 or self.__depth[v] < k or k < 0:
+            return None
+        # END IF
+        jump = self.__lifting()
+        level = 0
+        while k > 0:
+            if k & 1:
+                v = jump[level][v]
+            # END IF
+            k >>= 1
+            level += 1
+        # END WHILE
+
+        return self.__taxid(v)
+    # END DEF
+
+
+    def get_lca(self, node, other):  # OK (<< 1 second)
+        # lowest common ancestor of two taxa (one of them if it is an ancestor of the other),
+        # None if one of them is not in the tree
+        a = self.__node(node)
+        b = self.__node(other)
+        if a == -1 or b == -1 or self.__pre[a] == -1 or self.__pre[b] == -1:
+            return None
+        # END IF
+
+        return self.__taxid(self.__lca(a, b))
+    # END DEF
+
+
+    def get_lca_batch(self, pairs):  # OK (<< 1 second)
+        # get_lca for each (node, other) pair, the lifting table is built once
+        self.__lifting()
+
+        return [self.get_lca(node, other) for node, other in pairs]
+    # END DEF
+
+
+    def get_common_ancestor(self, nodes):  # OK (<< 1 second)
+        # lowest common ancestor of a group of taxa, e.g. the members of a Union taxon
+        common = None
+        for node in nodes:
+            common = node if common is None else self.get_lca(common, node)
+            if common is None or not self.has_node(common):
+                return None
             # END IF
         # END FOR
 
-        return name
+        return common
     # END DEF
 
 
     def get_node_rank(self, node):  # OK (<< 1 second)
-        if node not in self.__rank_list:
+        v = self.__node(node)
+        if v == -1:
             return None
         # END IF
 
-        return self.__rank_list[node]
+        return self.__ranks[self.__rank[v]]
     # END DEF
 
 
     def get_distance_from(self, node, target):  # OK (<< 1 second)
-        father = node
-        if father == '1' and target != '1':
+        # number of edges from node up to its ancestor target
+        v = self.__node(node)
+        t = self.__node(target)
+        if v == t:
+            return 0
+        # END IF
+        if v == -1 or t == -1 or not self.__contains(t, v):
             print('connection not found')
 
             return -1
         # END IF
 
-        d = 0
-        while father != target:
-            father = self.get_father(father)
-            d += 1
-            if father == '1' and target != '1':
-                print('connection not found')
+        return self.__depth[v] - self.__depth[t]
+    # END DEF
+
 
-                return -1
+    def get_distance_batch(self, pairs):  # OK (<< 1 second)
+        # number of edges between the two taxa of each pair through their lowest common ancestor,
+        # -1 if one of them is not in the tree
+        distances = []
+        for node, other in pairs:
+            a = self.__node(node)
+            b = self.__node(other)
+            if a == -1 or b == -1 or self.__pre[a] == -1 or self.__pre[b] == -1:
+                distances.append(-1)
+            else:
+                distances.append(self.__depth[a] + self.__depth[b] - 2 * self.__depth[self.__lca(a, b)])
             # END IF
-        # END WHILE
+        # END FOR
 
-        return d
+        return distances
     # END DEF
 
 # END CLASS
@@ -18,6 +18,7 @@
 import sys, argparse, copy, re
 from owlready2 import *
 from taxonLibrary3 import *
+from constraintStoreLibrary import *
 
 def main(args):
 
@@ -46,33 +47,55 @@ def main(args):
         #END FOR
     #END WITH
     constraints.close()
+    if args['db'] is None and args['out'] is None:
+        print("ERROR: one of -db or -out is required")
+        sys.exit(1)
+    #END IF
+    ## normalised store: the never_in GO of each subdivision once, and the taxa of each subdivision;
+    ## without -db it is only used to write -out
+    store = ConstraintStore(args['db'] if args['db'] is not None else ':memory:', create=True)
     taxon = ''
-    with open(args['out'],'w') as out:
-        with open(args['never_in'],'r') as never_in:
-            for line in never_in:
-                line = line.strip()
-                if line.startswith('>'):
-                    taxon = line[1:len(line)].strip()
-                else:
-                    values = line.split('\t')
-                    if taxon in union:
-                        for idTaxon in union[taxon]:
-                            taxname = union[taxon][idTaxon]
-                            out.write(f'{values[0]}\t{values[2]}\t{values[3]}\t{idTaxon}\t{taxname}\tNever in taxon\n')
-                        ##END FOR
-                    ##END IF
+    gos = []
+    with open(args['never_in'],'r') as never_in:
+        for line in never_in:
+            line = line.strip()
+            if line.startswith('>'):
+                if taxon:
+                    store.add_never_in(taxon, gos)
                 ##END IF
-            ##END FOR
-        ##END WITH
+                taxon = line[1:len(line)].strip()
+                gos = []
+            else:
+                values = line.split('\t')
+                gos.append((values[0], values[2], values[3]))
+            ##END IF
+        ##END FOR
+        if taxon:
+            store.add_never_in(taxon, gos)
+        ##END IF
     ##END WITH
-    out.close()
+    never_in.close()
+    for parent_name in union:
+        for idTaxon in union[parent_name]:
+            store.add_taxon(idTaxon, union[parent_name][idTaxon], parent_name)
+        ##END FOR
+    ##END FOR
+    if args['out'] is not None:
+        ## legacy text output: each never_in line once for each taxon of the subdivision
+        with open(args['out'],'w') as out:
+            out.writelines(store.iter_lines())
+        ##END WITH
+        out.close()
+    ##END IF
+    store.close(commit=args['db'] is not None)
 ##END MAIN
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='takes taxonConstraints file of taxa for which to calculate constraints takes file of NEVER_IN generated by createNeverIN.py rewrite output with the same format of the output generated by taxonConstraintsGOconsortium.py')
     parser.add_argument('-constraints', metavar='INPUT_FILE',  help='taxonConstraintsDef.txt file containing top taxa where to cluster species', required=True)
     parser.add_argument('-never_in', metavar='INPUT_FILE',  help='file output of createNeverIN.py where each taxa and its GOs are reported in mulfasta format', required=True)
-    parser.add_argument('-out', metavar='OUTPUT_FILE',  help='txt file containing output', required=True)
+    parser.add_argument('-db', metavar='OUTPUT_FILE',  help='SQLite constraint store with the never_in GO of each subdivision and the taxa of each subdivision, read by createConstraintsMergedAndSpecific.py -aut_db (required if -out is not given)', required=False)
+    parser.add_argument('-out', metavar='OUTPUT_FILE',  help='txt file containing output, one line for each never_in GO and taxon of its subdivision (required if -db is not given)', required=False)
     args = vars(parser.parse_args())
     main(args)
 #END MAIN